@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the hot paths of one-liner: parse_doc, construct_doc, every CLI mode end-to-end (the read-only ones
+also through the one-liner alias), sourcing the .one-liner file and the cold start of a generated alias. Everything
+runs locally on synthetic .one-liner files.
+
+    python3 benchmarks/benchmark.py --output results.json
+    python3 benchmarks/benchmark.py --baseline benchmarks/baseline.json --threshold 0.25
+    python3 benchmarks/benchmark.py --output benchmarks/baseline.json   # store a new baseline
+"""
+
+import argparse
+import copy
+import importlib.util
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ONE_LINER_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "one-liner.py")
+HEADER = """# This file is all you need for one-liner tool to work.
+# PARAMETERS START
+ONELINER_PATH="$HOME/.one-liner"
+export ONELINER_PATH
+
+ONELINER_PYTHON_EXEC="python3"
+export ONELINER_PYTHON_EXEC
+# PARAMETERS END"""
+WORDS = ["import", "os", "sys", "argparse", "logging", "def", "return", "print", "path", "args", "parser", "value",
+         "config", "result", "for", "in", "range", "with", "open", "file", "read", "write", "json", "data"]
+
+
+def load_one_liner():
+    # one-liner.py isn't importable by its name because of the hyphen
+    spec = importlib.util.spec_from_file_location("one_liner", ONE_LINER_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def synthetic_script(size, rng):
+    lines = []
+    while sum(len(line) + 1 for line in lines) < size:
+        lines.append("v{} = {!r}".format(len(lines), " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 12)))))
+    return "\n".join(lines) + "\n"
+
+
+def generate_doc(one_liner, aliases, payload_size, comment_density, kind="source", store="inline", seed=0):
+    # a .one-liner file with the one-liner tool itself and the given number of synthetic aliases
+    rng = random.Random(seed)
+    oneLinerDB = {"info_and_params": {"contents": HEADER}}
+    # the one-liner tool is encoded the way init does it, so that its alias hits the code object cache
+    tool, _ = one_liner._encode_payload(open(ONE_LINER_SCRIPT, encoding='utf-8').read().encode('utf-8'), "bytecode",
+                                        precompile=False)
+    oneLinerDB["one-liner"] = {"entire_line": one_liner._alias_line("one-liner", tool, kind="bytecode"),
+                               "comments": ['', '']}
+    for i in range(aliases):
+        payload, codec = one_liner._encode_payload(synthetic_script(payload_size, rng).encode('utf-8'), kind)
+        comments = ["# synthetic alias {}\n# generated by the benchmark".format(i), ''] \
+            if rng.random() < comment_density else ['', '']
+        oneLinerDB["alias{}".format(i)] = {"entire_line": one_liner._alias_line("alias{}".format(i), payload,
+                                                                                store=store, kind=kind, codec=codec),
+                                           "comments": comments}
+    one_liner.construct_doc(oneLinerDB)
+
+
+def measure(func, repeat, setup=None):
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {"median_ms": statistics.median(timings), "min_ms": min(timings), "runs": repeat}
+
+
+class Benchmark:
+    def __init__(self, args):
+        self.args = args
+        self.workdir = tempfile.mkdtemp(prefix="one-liner-benchmark-")
+        self.doc = os.path.join(self.workdir, ".one-liner")
+        self.env = dict(os.environ, HOME=self.workdir, ONELINER_PATH=self.doc,
+                        ONELINER_PYTHON_EXEC=args.python, XDG_CACHE_HOME=os.path.join(self.workdir, ".cache"))
+        os.environ.update(ONELINER_PATH=self.doc, ONELINER_PYTHON_EXEC=args.python)
+        self.module = load_one_liner()
+        self.one_liner = self.module.OneLiner([])
+        self.results = {}
+
+    def run(self):
+        try:
+            for aliases in self.args.aliases:
+                for payload_size in self.args.payload_sizes:
+                    for comment_density in self.args.comment_densities:
+                        self.run_doc(aliases, payload_size, comment_density)
+            self.run_alias_startup()
+        finally:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+        return self.results
+
+    def record(self, name, result):
+        self.results[name] = result
+        print("{:70s} median {:9.3f} ms  min {:9.3f} ms".format(name, result["median_ms"], result["min_ms"]))
+
+    def run_doc(self, aliases, payload_size, comment_density):
+        suffix = "[aliases={},payload={},comments={}]".format(aliases, payload_size, comment_density)
+        generate_doc(self.one_liner, aliases, payload_size, comment_density)
+        pristine = open(self.doc, 'rb').read()
+        self.one_liner.load_index()
+        pristine_index = open(self.doc + ".index", 'rb').read()
+        pristine_mtime = os.stat(self.doc).st_mtime_ns
+
+        def restore():
+            # the mtime is restored as well, otherwise the index is stale and every mode rebuilds it
+            with open(self.doc, 'wb') as file:
+                file.write(pristine)
+            os.utime(self.doc, ns=(pristine_mtime, pristine_mtime))
+            with open(self.doc + ".index", 'wb') as file:
+                file.write(pristine_index)
+
+        repeat = self.args.repeat
+        self.record("parse_doc" + suffix, measure(self.one_liner.parse_doc, repeat))
+        oneLinerDB = self.one_liner.parse_doc()
+        self.record("construct_doc" + suffix,
+                    measure(lambda: self.one_liner.construct_doc(copy.deepcopy(oneLinerDB)), repeat, restore))
+        restore()
+        self.record("source" + suffix, measure(lambda: self.call(["bash", "-c", "source " + self.doc]), repeat))
+
+        # every CLI mode end-to-end, the .one-liner file is only restored before each run of the writing modes
+        script = os.path.join(self.workdir, "script.py")
+        with open(script, 'w', encoding='utf-8') as file:
+            file.write(synthetic_script(payload_size, random.Random(1)))
+        name = "alias{}".format(aliases // 2)
+        cli_modes = {
+            "list": ["list"],
+            "print": ["print", name],
+            "dump": ["dump", name],
+            "create": ["-y", "create", "new_alias", script],
+            "overwrite": ["-y", "overwrite", name, script],
+            "rename": ["-y", "rename", name, "renamed_alias"],
+            "delete": ["-y", "delete", name],
+            "fix": ["fix"],
+        }
+        writing_modes = ["create", "overwrite", "rename", "delete", "fix"]
+        for mode, cmd_args in cli_modes.items():
+            setup = restore if mode in writing_modes else None
+            self.record("cli_{}{}".format(mode, suffix),
+                        measure(lambda: self.call([self.args.python, ONE_LINER_SCRIPT] + cmd_args), repeat, setup))
+            restore()
+        # the read-only modes through the one-liner alias, as they are used: fast path, index and code object cache
+        source = "source {}\n".format(self.doc)
+        self.call(["bash", "-O", "expand_aliases", "-c", source + "one-liner ls"])  # warm the code object cache
+        for mode in ["list", "print", "dump"]:
+            command = ["bash", "-O", "expand_aliases", "-c", source + " ".join(["one-liner"] + cli_modes[mode])]
+            self.record("alias_cli_{}{}".format(mode, suffix), measure(lambda: self.call(command), repeat))
+
+    def run_alias_startup(self):
+        # cold start of a single generated alias, run in a fresh bash with only that alias defined
+        rng = random.Random(2)
+        for kind in ["source", "bytecode"]:
+            for store in ["inline", "blob"]:
+                for payload_size in self.args.payload_sizes:
+                    payload, codec = self.one_liner._encode_payload(synthetic_script(payload_size, rng).encode('utf-8'),
+                                                                    kind)
+                    entire_line = self.one_liner._alias_line("bench_alias", payload, store=store, kind=kind,
+                                                             codec=codec)
+                    command = ["bash", "-O", "expand_aliases", "-c", entire_line + "\nbench_alias"]
+                    self.call(command)  # warm the code object cache of the bytecode payloads
+                    self.record("alias_startup[kind={},store={},payload={}]".format(kind, store, payload_size),
+                                measure(lambda: self.call(command), self.args.repeat))
+        self.record("python_startup", measure(lambda: self.call([self.args.python, "-c", "pass"]), self.args.repeat))
+
+    def call(self, command):
+        subprocess.run(command, env=self.env, cwd=self.workdir, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def compare(results, baseline, threshold, thresholds):
+    # a benchmark regresses when its median is slower than the baseline by more than its threshold
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+        limit = next((value for prefix, value in thresholds.items() if name.startswith(prefix)), threshold)
+        change = result["median_ms"] / baseline[name]["median_ms"] - 1
+        if change > limit:
+            regressions.append(name)
+        print("{:70s} {:+7.1%} (limit {:+.0%}){}".format(name, change, limit, "  REGRESSION" if change > limit else ""))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the hot paths of one-liner on synthetic .one-liner files.")
+    parser.add_argument("--aliases", type=int, nargs="+", default=[10, 100, 1000], help="alias counts")
+    parser.add_argument("--payload-sizes", type=int, nargs="+", default=[200, 5000], help="script sizes in bytes")
+    parser.add_argument("--comment-densities", type=float, nargs="+", default=[0.0, 0.5],
+                        help="fraction of the aliases with comments")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per benchmark, the median is compared")
+    parser.add_argument("--python", type=str, default=sys.executable, help="interpreter running one-liner")
+    parser.add_argument("--output", type=str, help="write the results to this JSON file")
+    parser.add_argument("--baseline", type=str, help="compare the results against this JSON file")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed slowdown against the baseline, 0.2 is 20%% (default)")
+    parser.add_argument("--threshold-for", type=str, action="append", default=[], metavar="PREFIX=THRESHOLD",
+                        help="allowed slowdown for the benchmarks starting with PREFIX, e.g. alias_startup=0.5")
+    args = parser.parse_args()
+
+    results = Benchmark(args).run()
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump({"python": platform.python_version(), "platform": platform.platform(), "results": results},
+                      file, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)["results"]
+        thresholds = {prefix: float(value) for prefix, value in
+                      (threshold.split("=", 1) for threshold in args.threshold_for)}
+        regressions = compare(results, baseline, args.threshold, thresholds)
+        if regressions:
+            print("{} benchmark(s) regressed".format(len(regressions)))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
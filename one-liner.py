@@ -1,19 +1,55 @@
 #!/usr/bin/env python3
 
-import base64
-import argparse
 import sys
 import os
-import re
-import logging
 import zlib
-import traceback
+import binascii
+import fcntl
+import stat
+import mmap
+import marshal
+import time
+try:
+    # already loaded by the interpreter, importing importlib.util for it takes a few milliseconds
+    from _frozen_importlib_external import MAGIC_NUMBER
+except ImportError:
+    from importlib.util import MAGIC_NUMBER
+# argparse, re, logging, json and the rest of the heavier modules are imported by the methods that need them so that
+# the read-only modes don't pay for them, see OneLiner.parse_fast
+
+
+def _profiled(phase):
+    # records the wall and the CPU time of the decorated method under the given phase, see OneLiner.Profiler
+    def decorator(method):
+        def wrapper(self, *args, **kwargs):
+            with self.profiler.phase(phase):
+                return method(self, *args, **kwargs)
+        wrapper.__name__, wrapper.__qualname__, wrapper.__doc__ = method.__name__, method.__qualname__, method.__doc__
+        return wrapper
+    return decorator
 
 
 class OneLiner:
-    class Args(argparse.Namespace):
-        mode = name = filepath = script = verb = ""
-        verbose = yes = False
+    class Args:
+        mode = name = alias_name = filepath = dirpath = script = verb = ""
+        store = "inline"
+        journal = prune = overwrite = False
+        pack = ""
+        payload = "source"
+        codec = "zlib"
+        decode_budget = 1.0
+        verbose = yes = json = profile = False
+        profile_format = "table"
+        cprofile = ""
+        launcher = "inline"
+        preload = []
+        foreground = False
+        query = ""
+        regex = ignore_case = names_only = False
+        context = 0
+        train_zdict = quarantine = False
+        max_length = 0
+        zdict_size = 32768
 
     class Formatter:
         rocket = '🚀'
@@ -29,106 +65,409 @@ class OneLiner:
         def bold_text(self, format_str):
             return '\033[1m' + format_str + '\033[0m'
 
+    class Profiler:
+        class Phase:
+            def __init__(self, profiler, phase):
+                self.profiler, self.phase = profiler, phase
+                self.wall_time = self.cpu_time = 0
+
+            def __enter__(self):
+                self.wall_time, self.cpu_time = time.perf_counter(), time.process_time()
+
+            def __exit__(self, *exc_info):
+                self.profiler.record(self.phase, time.perf_counter() - self.wall_time,
+                                     time.process_time() - self.cpu_time)
+
+        def __init__(self):
+            # phase -> [calls, wall time, CPU time] in seconds, nested phases are included in their parents
+            self.phases = {}
+
+        def record(self, phase, wall_time, cpu_time):
+            calls, total_wall_time, total_cpu_time = self.phases.get(phase, [0, 0, 0])
+            self.phases[phase] = [calls + 1, total_wall_time + wall_time, total_cpu_time + cpu_time]
+
+        def phase(self, phase):
+            return OneLiner.Profiler.Phase(self, phase)
+
+        def report(self, profile_format):
+            if profile_format == "json":
+                import json
+                return json.dumps({phase: {"calls": calls, "wall_ms": wall_time * 1000, "cpu_ms": cpu_time * 1000}
+                                   for phase, (calls, wall_time, cpu_time) in self.phases.items()}, indent=2)
+            report = "{:16s} {:>6s} {:>10s} {:>10s}".format("phase", "calls", "wall ms", "cpu ms")
+            for phase, (calls, wall_time, cpu_time) in self.phases.items():
+                report += "\n{:16s} {:6d} {:10.3f} {:10.3f}".format(phase, calls, wall_time * 1000, cpu_time * 1000)
+            return report
+
+    class DocLock:
+        # serializes the read-modify-write of the .one-liner file between the one-liner processes
+        def __init__(self, one_liner):
+            self.one_liner = one_liner
+            self.lock_file = None
+
+        def __enter__(self):
+            self.lock_file = open(self.one_liner.one_liner_lock_file, 'a')
+            self.one_liner.logger.debug("Waiting for the lock on the .one-liner file")
+            with self.one_liner.profiler.phase("lock"):
+                fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+
+        def __exit__(self, *exc_info):
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+            self.lock_file.close()
+
+    class PackReader:
+        # OneLiner.pack_magic, the length of the header, the marshalled header and the payloads one after another. A
+        # regular file is memory-mapped and only the requested payloads are read, a pipe is read sequentially
+        def __init__(self, file):
+            if file.read(len(OneLiner.pack_magic)) != OneLiner.pack_magic:
+                raise ValueError("not a one-liner pack")
+            header_length = int.from_bytes(file.read(8), 'little')
+            header = marshal.loads(file.read(header_length))
+            self.entries, self.zdicts = header["entries"], header["zdicts"]
+            # position of the pipe relative to the first payload
+            self.file, self.position = file, 0
+            self.pack = None
+            if stat.S_ISREG(os.fstat(file.fileno()).st_mode):
+                self.pack = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                self.base = len(OneLiner.pack_magic) + 8 + header_length
+
+        def payload(self, entry):
+            # a pipe can only be read forward, the payloads have to be requested in the order of the entries
+            if self.pack is not None:
+                return self.pack[self.base + entry["offset"]:self.base + entry["offset"] + entry["length"]]
+            self.file.read(entry["offset"] - self.position)
+            self.position = entry["offset"] + entry["length"]
+            return self.file.read(entry["length"])
+
+        def close(self):
+            if self.pack is not None:
+                self.pack.close()
+
+    modes = {
+        "init": ["init"],
+        "create": ["create", "cr", "touch"],
+        "overwrite": ["overwrite", "ov"],
+        "rename": ["rename", "mv"],
+        "print": ["print", "pr", "echo"],
+        "dump": ["dump", "dmp", "export", "cat"],
+        "list": ["list", "ls"],
+        "delete": ["delete", "del", "rm"],
+        "fix": ["fix", "format"],
+        "stats": ["stats"],
+        "server": ["server"],
+        "search": ["search", "grep"],
+        "sync": ["sync"],
+        "verify": ["verify", "check"],
+        "import": ["import"],
+    }
+    # resolves the mode aliases, e.g. 'ls' -> 'list'
+    mode_of = {mode_cli: mode for mode, mode_clis in modes.items() for mode_cli in mode_clis}
+
+    mode_desc_dict = {
+        "init": "initialize the .one-liner file",
+        "create": "create and add one-liner",
+        "overwrite": "create and overwrite one-liner",
+        "rename": "rename a one-liner",
+        "print": "print the alias line of one-liner",
+        "dump": "decode the one-liner and dump it either on the shell or to a file",
+        "list": "list the all one-liners",
+        "delete": "remove a one-liner",
+        "fix": "fix .one-liner file by parsing and construct the .one-liner file again",
+        "stats": "report the sizes and the decode times of the one-liners",
+        "server": "start, stop or check the warm interpreter that runs the '--launcher server' one-liners",
+        "search": "search the decoded sources of the one-liners",
+        "sync": "mirror a directory of python scripts, only the changed scripts are encoded again",
+        "verify": "check that every one-liner decodes and compiles",
+        "import": "merge the one-liners of a pack made with 'dump --pack' into the .one-liner file",
+    }
+
+    # modes that modify the .one-liner file and run under OneLiner.DocLock
+    writing_modes = ["init", "create", "overwrite", "rename", "delete", "fix", "sync", "import"]
+
     def __init__(self, cmd_args):
-        self.modes = {
-            "init": ["init"],
-            "create": ["create", "cr", "touch"],
-            "overwrite": ["overwrite", "ov"],
-            "rename": ["rename", "mv"],
-            "print": ["print", "pr", "echo"],
-            "dump": ["dump", "dmp", "export", "cat"],
-            "list": ["list", "ls"],
-            "delete": ["delete", "del", "rm"],
-            "fix": ["fix", "format"],
-        }
-
-        self.mode_desc_dict = {
-            "init": "initialize the .one-liner file",
-            "create": "create and add one-liner",
-            "overwrite": "create and overwrite one-liner",
-            "rename": "rename a one-liner",
-            "print": "print the alias line of one-liner",
-            "dump": "decode the one-liner and dump it either on the shell or to a file",
-            "list": "list the all one-liners",
-            "delete": "remove a one-liner",
-            "fix": "fix .one-liner file by parsing and construct the .one-liner file again",
-        }
-        # make sure that the aliases are correctly interpreted
-        for mode in list(self.mode_desc_dict.keys()).copy():
-            for mode_alias in self.modes[mode]:
-                self.mode_desc_dict[mode_alias] = self.mode_desc_dict[mode]
+        init_wall_time, init_cpu_time = time.perf_counter(), time.process_time()
+        self.profiler = OneLiner.Profiler()
 
         self.one_liner_alias_file = os.environ["ONELINER_PATH"]
+        # content-addressed payloads of the one-liners created with '--store blob'
+        self.one_liner_blob_dir = self.one_liner_alias_file + ".blobs"
+        # name -> byte offset, length and payload hash of each one-liner, see load_index
+        self.one_liner_index_file = self.one_liner_alias_file + ".index"
+        self.one_liner_index = None
+        # version -> shared compression dictionary of the '--codec zdict' one-liners, see _zdicts
+        self.one_liner_zdicts = None
+        # module -> import time in milliseconds of the decompression modules, see _import_times
+        self.import_times = None
+        # serializes the read-modify-write of the .one-liner file between the one-liner processes
+        self.one_liner_lock_file = self.one_liner_alias_file + ".lock"
+        # synced directory -> stats and hashes of its scripts at the last sync, see _handle_sync
+        self.one_liner_sync_file = self.one_liner_alias_file + ".sync"
+        # the broken one-liners moved out of the .one-liner file by 'verify --quarantine'
+        self.one_liner_quarantine_file = self.one_liner_alias_file + ".quarantine"
+        # unix socket and pid file of 'one-liner server', see _serve
+        self.one_liner_server_socket = self.one_liner_alias_file + ".sock"
+        self.one_liner_server_pid_file = self.one_liner_alias_file + ".pid"
         self.one_liner_python_exec = os.environ["ONELINER_PYTHON_EXEC"]
 
-        self.logger = logging.getLogger('one-liner')
-        self.logger.setLevel(logging.WARNING)
-        ch = logging.StreamHandler()
-        ch.setLevel(logging.DEBUG)
-        ch.setFormatter(logging.Formatter('%(levelname)s: %(message)s'))
-        self.logger.addHandler(ch)
+        # set up on first use, see the logger property
+        self._logger = None
 
         self.cmd_args = cmd_args
 
-        self.help_only = self.cmd_args in [['-h'], ['--help']]
-
         # Check to see if the only argument is the -h or --help
-        self.mode_parser = argparse.ArgumentParser(add_help=self.help_only,
-                                                   description='Manage one-liner python bash aliases '
-                                                               'without relying on the original script file.'
-                                                               'To view the required arg(s) for each of the modes, '
-                                                               'add the help flag (-h) to the mode. '
-                                                               'For example, -> one-liner create -h',
-                                                   usage="one-liner [-h] [-v] mode [mode-specific-required-args]...",
-                                                   formatter_class=argparse.RawTextHelpFormatter)
-        self.mode_parser.add_argument('mode', type=str, metavar='mode',
-                                      choices=[mode_cli for mode in self.modes for mode_cli in self.modes[mode]],
-                                      help=self.modes_help() if self.help_only else argparse.SUPPRESS)
-        self.mode_parser.add_argument("-v", "--verbose", default=False, action="store_true",
-                                      help="enable debug printing")
-        self.mode_parser.add_argument("-y", "--yes", default=False, action="store_true",
-                                      help="skip the 'Do you want to continue? [y/N]' prompt")
+        self.help_only = self.cmd_args in [['-h'], ['--help']]
         self.args = OneLiner.Args()
 
         self.fmt = OneLiner.Formatter()
+        self.profiler.record("init", time.perf_counter() - init_wall_time, time.process_time() - init_cpu_time)
 
+    @property
+    def logger(self):
+        if self._logger is None:
+            import logging
+            self._logger = logging.getLogger('one-liner')
+            self._logger.setLevel(logging.DEBUG if self.args.verbose else logging.WARNING)
+            ch = logging.StreamHandler()
+            ch.setLevel(logging.DEBUG)
+            ch.setFormatter(logging.Formatter('%(levelname)s: %(message)s'))
+            self._logger.addHandler(ch)
+        return self._logger
+
+    codecs = ["none", "zlib"] + ["zlib-{}".format(level) for level in range(1, 10)] + ["bz2", "lzma", "zdict"]
+
+    # the shared compression dictionaries are plain shell variables in the parameters of the .one-liner file
+    zdict_regex = "^ONELINER_ZDICT_([0-9]+)=\"([A-Za-z0-9+/=]*)\"$"
+    # code objects kept by 'one-liner server', see _serve
+    server_code_cache_size = 256
+    # first bytes of the packs written by 'dump --pack', the last byte is the version of the format
+    pack_magic = b"OLPACK\x00\x01"
+    # longest single argument that execve accepts on linux (MAX_ARG_STRLEN), the code of an alias is one argument
+    max_arg_strlen = 131072
+
+    alias_regex = "^alias( +)[a-zA-Z0-9-_]+=('.*'|\".*\")$"
+    name_regex = "^[a-zA-Z0-9-_]+$"
+    # comment above the one-liners created by sync, the script they were encoded from and its hash
+    sync_marker = "# one-liner sync: {} sha256:{}"
+    sync_marker_regex = "^# one-liner sync: (.+) sha256:([0-9a-f]{64})$"
+
+    # executed by the aliases created with '--payload bytecode', the code object is cached per payload hash and
+    # per interpreter so that the repeated invocations skip decoding and compiling altogether
+    bytecode_launcher = """import os
+import marshal
+try:
+    from _frozen_importlib_external import MAGIC_NUMBER
+except ImportError:
+    from importlib.util import MAGIC_NUMBER
+cache = os.path.join('{cache}', '{payload_hash}.' + MAGIC_NUMBER.hex())
+try:
+    with open(cache, 'rb') as cache_file:
+        code = marshal.loads(cache_file.read())
+except Exception:
+    data = {decompress}({payload})
+    n = 8 + int.from_bytes(data[4:8], 'little')
+    code = marshal.loads(data[8:n]) if data[:4] == MAGIC_NUMBER else compile(data[n:], '<string>', 'exec')
+    try:
+        os.makedirs(os.path.dirname(cache), exist_ok=True)
+        with open(cache + '.' + str(os.getpid()), 'wb') as cache_file:
+            cache_file.write(marshal.dumps(code))
+        os.replace(cache + '.' + str(os.getpid()), cache)
+    except OSError:
+        pass
+exec(code)"""
+
+    # executed by the aliases created with '--launcher server' once the payload is decompressed into data. The
+    # payload runs in a child forked from the warm interpreter of 'one-liner server' with the argv, cwd, environment
+    # and stdio of this process, or right here if the server isn't running or doesn't take the request (e.g. the payload
+    # doesn't compile, so that the error is reported as with the inline launcher). These aliases are started with -S,
+    # the site-packages are only set up for the fallback
+    server_launcher = """import os
+import sys
+import marshal
+import _socket
+import _signal
+sock = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+if sock.connect_ex(os.environ['ONELINER_PATH'] + '.sock') == 0:
+    request = marshal.dumps(({precompiled}, data, sys.argv, os.getcwd(), dict(os.environ)))
+    fds = b''.join(fd.to_bytes(4, sys.byteorder) for fd in range(3))
+    sock.sendmsg([len(request).to_bytes(8, 'little')], [(_socket.SOL_SOCKET, _socket.SCM_RIGHTS, fds)])
+    sock.sendall(request)
+    pid = int.from_bytes(sock.recv(4), 'little')
+    if pid:
+        for signum in [_signal.SIGINT, _signal.SIGTERM, _signal.SIGHUP, _signal.SIGQUIT]:
+            _signal.signal(signum, lambda signum, frame: os.kill(pid, signum))
+        status = sock.recv(4)
+        sys.exit(int.from_bytes(status, 'little', signed=True) if status else 1)
+sock.close()
+import site
+site.main()
+{run}"""
+
+    def parse_fast(self):
+        # 'list' and 'print NAME' without any options skip argparse, everything else goes through parse_cli
+        mode = self.mode_of.get(self.cmd_args[0]) if self.cmd_args else None
+        if (mode, len(self.cmd_args)) not in [("list", 1), ("print", 2)] or self.cmd_args[-1].startswith("-"):
+            return False
+        self.args.mode = self.cmd_args[0]
+        self.args.name = self.cmd_args[1] if mode == "print" else ""
+        return True
+
+    @_profiled("parse_cli")
     def parse_cli(self):
+        import argparse
+
+        mode_parser = argparse.ArgumentParser(add_help=self.help_only,
+                                              description='Manage one-liner python bash aliases '
+                                                          'without relying on the original script file.'
+                                                          'To view the required arg(s) for each of the modes, '
+                                                          'add the help flag (-h) to the mode. '
+                                                          'For example, -> one-liner create -h',
+                                              usage="one-liner [-h] [-v] mode [mode-specific-required-args]...",
+                                              formatter_class=argparse.RawTextHelpFormatter)
+        mode_parser.add_argument('mode', type=str, metavar='mode', choices=list(self.mode_of),
+                                 help=self.modes_help() if self.help_only else argparse.SUPPRESS)
+        mode_parser.add_argument("-v", "--verbose", default=False, action="store_true",
+                                 help="enable debug printing")
+        mode_parser.add_argument("-y", "--yes", default=False, action="store_true",
+                                 help="skip the 'Do you want to continue? [y/N]' prompt")
+        mode_parser.add_argument("--profile", default=False, action="store_true",
+                                 help="print the wall and the CPU time spent in each phase to stderr")
+        mode_parser.add_argument("--profile-format", type=str, default="table", choices=["table", "json"],
+                                 help="format of the --profile breakdown (default: table)")
+        mode_parser.add_argument("--cprofile", type=str, default="", metavar="FILE",
+                                 help="dump the cProfile stats of the selected mode to FILE")
         try:
-            self.mode_parser.parse_known_args(self.cmd_args, namespace=self.args)
+            mode_parser.parse_known_args(self.cmd_args, namespace=self.args)
         except SystemExit as e:
             if e.code == 2:  # if a parsing error occurs, print help
                 OneLiner(['--help']).parse_cli()
             if self.help_only or e.code == 2:
                 raise SystemExit
 
-        mode_specific_parser = argparse.ArgumentParser(parents=[self.mode_parser],
+        mode = self.mode_of[self.args.mode]
+        mode_specific_parser = argparse.ArgumentParser(parents=[mode_parser],
                                                        description=self.mode_description(),
                                                        formatter_class=argparse.RawTextHelpFormatter)
         # modes that require/hold-it-optional one-liner name
-        modes_name = ["create", "overwrite", "rename", "print", "dump", "delete"]
-        if self.args.mode in [a for l in self.modes.items() if l[0] in modes_name for a in l[1]]:
-            nargs = "?" if self.args.mode in self.modes["create"] else None
-            nargs = 2 if self.args.mode in self.modes["rename"] else nargs
+        if mode in ["create", "overwrite", "rename", "print", "dump", "delete"]:
+            nargs = "?" if mode in ["create", "overwrite", "dump"] else None
+            nargs = 2 if mode == "rename" else nargs
             mode_specific_parser.add_argument('name', type=str, default="",
                                               nargs=nargs,
                                               help='alias name for the one-line. If rename mode, first name is the old'
                                                    ' and the second name is the new name.')
         # modes that require/hold-it-optional one-liner filepath
-        modes_name = ["create", "overwrite", "dump"]
-        if self.args.mode in [a for l in self.modes.items() if l[0] in modes_name for a in l[1]]:
+        if mode in ["create", "overwrite", "dump"]:
             mode_specific_parser.add_argument('filepath', type=str, default="",
-                                              nargs="?" if self.args.mode in self.modes["dump"] else None,
-                                              help='file path for the python script to be converted to/from one-liner')
+                                              nargs="?" if mode == "dump" else "+",
+                                              help='file path for the python script to be converted to/from\n'
+                                                   'one-liner. If create/overwrite mode, multiple file paths,\n'
+                                                   'directories and glob patterns can be given to convert the\n'
+                                                   'scripts in one go. A first argument that exists on disk is a\n'
+                                                   'path, use --name to name a single script then.')
+        # modes that require a directory
+        if mode in ["sync"]:
+            mode_specific_parser.add_argument('dirpath', type=str,
+                                              help='directory of the python scripts, every .py file below it is\n'
+                                                   'mirrored to a one-liner')
+            mode_specific_parser.add_argument('--prune', default=False, action="store_true",
+                                              help='delete the one-liners whose script was removed from the directory')
+        # modes that read/write a pack
+        if mode in ["dump", "import"]:
+            mode_specific_parser.add_argument('--pack', type=str, default="", required=mode == "import", metavar='PACK',
+                                              help='binary pack of the one-liners, - for stdout/stdin.\n'
+                                                   'If dump mode, every one-liner is packed if no name is given')
+        if mode in ["import"]:
+            mode_specific_parser.add_argument('--overwrite', default=False, action="store_true",
+                                              help='the one-liners are expected to exist already, as in overwrite mode')
+            mode_specific_parser.add_argument('--json', default=False, action="store_true",
+                                              help='print the per-one-liner results as JSON')
+        # modes that encode a new payload
+        if mode in ["create", "overwrite", "sync"]:
+            mode_specific_parser.add_argument('--store', type=str, default="inline", choices=["inline", "blob"],
+                                              help='inline: embed the payload in the alias line (default)\n'
+                                                   'blob: keep the payload in ' + self.one_liner_blob_dir +
+                                              ' and only\n      reference its hash from the alias line')
+            mode_specific_parser.add_argument('--payload', type=str, default="source", choices=["source", "bytecode"],
+                                              help='source: compile the script on every call (default)\n'
+                                                   'bytecode: store the marshalled code object and cache it per\n'
+                                                   '          interpreter in ' + self._cache_dir())
+            mode_specific_parser.add_argument('--codec', type=str, default="zlib", choices=self.codecs + ["auto"],
+                                              help='compression of the payload (default: zlib, same as zlib-9)\n'
+                                                   'zdict: zlib with the dictionary shared by the one-liners, see\n'
+                                                   '       fix --train-zdict\n'
+                                                   'auto: benchmark the codecs on the script and pick the smallest\n'
+                                                   '      payload that decodes within --decode-budget')
+            mode_specific_parser.add_argument('--launcher', type=str, default="inline", choices=["inline", "server"],
+                                              help='inline: run the payload in a new interpreter (default)\n'
+                                                   'server: run the payload in a child of the warm interpreter of\n'
+                                                   '        one-liner server, inline if the server isn\'t running')
+            mode_specific_parser.add_argument('--decode-budget', type=float, default=1.0, metavar='MS',
+                                              help='import + decode time budget in milliseconds for --codec auto\n'
+                                                   '(default: 1.0)')
+            mode_specific_parser.add_argument('--json', default=False, action="store_true",
+                                              help='print the per-file results of a batch as JSON')
+        if mode in ["create", "overwrite"]:
+            mode_specific_parser.add_argument('--name', type=str, default="", dest="alias_name", metavar='NAME',
+                                              help='alias name for a single script, when the name argument would be\n'
+                                                   'taken for a path')
+            mode_specific_parser.add_argument('--journal', default=False, action="store_true",
+                                              help='append the one-liner to the end of the .one-liner file instead of\n'
+                                                   'rewriting it, run fix to compact the file again')
+        # modes that re-encode the one-liners
+        if mode in ["fix"]:
+            mode_specific_parser.add_argument('--train-zdict', default=False, action="store_true",
+                                              help='train a new compression dictionary on the lines the one-liners\n'
+                                                   'have in common and re-encode them with it (--codec zdict)')
+            mode_specific_parser.add_argument('--zdict-size', type=int, default=32768, metavar='BYTES',
+                                              help='maximum size of the trained dictionary (default: 32768)')
+        # modes that report machine-readable results
+        if mode in ["stats"]:
+            mode_specific_parser.add_argument('--json', default=False, action="store_true",
+                                              help='print the results as JSON')
+        # modes that verify the one-liners
+        if mode in ["verify"]:
+            mode_specific_parser.add_argument('--quarantine', default=False, action="store_true",
+                                              help='move the broken one-liners to ' + self.one_liner_quarantine_file)
+            mode_specific_parser.add_argument('--max-length', type=int, default=0, metavar='BYTES',
+                                              help='longest code an alias may pass to the interpreter\n'
+                                                   '(default: ARG_MAX, at most {} on linux)'.
+                                              format(self.max_arg_strlen))
+            mode_specific_parser.add_argument('--json', default=False, action="store_true",
+                                              help='print the results as JSON')
+        # modes that search the one-liners
+        if mode in ["search"]:
+            mode_specific_parser.add_argument('query', type=str, help='text to search for, a regex with --regex')
+            mode_specific_parser.add_argument('-E', '--regex', default=False, action="store_true",
+                                              help='interpret the query as a regular expression')
+            mode_specific_parser.add_argument('-i', '--ignore-case', default=False, action="store_true",
+                                              help='ignore the case of the query')
+            mode_specific_parser.add_argument('-C', '--context', type=int, default=0, metavar='LINES',
+                                              help='print LINES of context around the matching lines')
+            mode_specific_parser.add_argument('-l', '--names-only', default=False, action="store_true",
+                                              help='only print the names of the matching one-liners')
+            mode_specific_parser.add_argument('--json', default=False, action="store_true",
+                                              help='print the matching lines as JSON')
+        # modes that control the server
+        if mode in ["server"]:
+            mode_specific_parser.add_argument('verb', type=str, choices=["start", "stop", "status"],
+                                              help='start, stop or check the server')
+            mode_specific_parser.add_argument('--preload', type=str, nargs='*', metavar='MODULE',
+                                              default=["argparse", "json", "logging", "pathlib", "re", "subprocess"],
+                                              help='modules imported by the server before it forks the one-liners\n'
+                                                   '(default: argparse json logging pathlib re subprocess)')
+            mode_specific_parser.add_argument('--foreground', default=False, action="store_true",
+                                              help='keep the server in the foreground instead of daemonizing it')
         # modes that require script
-        modes_name = ["init"]
-        if self.args.mode in [a for l in self.modes.items() if l[0] in modes_name for a in l[1]]:
+        if mode in ["init"]:
             mode_specific_parser.add_argument('script', type=str, help='code for the one-liner as a string')
 
         mode_specific_parser.usage = mode_specific_parser.format_usage(). \
             replace('usage: -c', 'one-liner ' + self.args.mode)
-        mode_specific_parser.parse_args(self.cmd_args, namespace=self.args)
+        # intermixed: with the options first, parse_args would fill the optional name before it sees the file paths
+        mode_specific_parser.parse_intermixed_args(self.cmd_args, namespace=self.args)
 
         if self.args.verbose:
+            import logging
             self.logger.setLevel(logging.DEBUG)
 
     def modes_help(self):
@@ -147,100 +486,341 @@ class OneLiner:
         return mode_help_text.rstrip(" ").rstrip(",")
 
     def mode_description(self):
-        return "selected mode -> " + self.args.mode + ": " + self.mode_desc_dict[self.args.mode]
+        return "selected mode -> " + self.args.mode + ": " + self.mode_desc_dict[self.mode_of[self.args.mode]]
 
     def handle(self):
-        self.parse_cli()
-        oneLinerDB = self.parse_doc()
+        if not self.parse_fast():
+            self.parse_cli()
+
+        with self.profiler.phase("handle"):
+            if self.mode_of[self.args.mode] in self.writing_modes or self.args.quarantine:
+                with OneLiner.DocLock(self):
+                    self._run()
+            else:
+                self._run()
+
+        if self.args.profile:
+            print(self.profiler.report(self.args.profile_format), file=sys.stderr)
 
-        if self.args.mode in self.modes["init"]:
-            self._handle_init(oneLinerDB, self.args.script)
-        elif self.args.mode in self.modes["print"]:
-            self._handle_print(oneLinerDB, self.args.name)
-        elif self.args.mode in self.modes["create"]:
-            self._handle_create_overwrite(oneLinerDB, self.args.name, self.args.filepath)
-        elif self.args.mode in self.modes["overwrite"]:
-            self._handle_create_overwrite(oneLinerDB, self.args.name, self.args.filepath, overwrite=True)
-        elif self.args.mode in self.modes["rename"]:
-            self._handle_rename(oneLinerDB, self.args.name[0], self.args.name[1])
-        elif self.args.mode in self.modes["dump"]:
-            self._handle_export(oneLinerDB, self.args.name, self.args.filepath)
-        elif self.args.mode in self.modes["list"]:
-            self._handle_list(oneLinerDB)
-        elif self.args.mode in self.modes["delete"]:
-            self._handle_delete(oneLinerDB, self.args.name)
-        elif self.args.mode in self.modes["fix"]:
+    def _run(self):
+        if not self.args.cprofile:
+            self._dispatch()
+            return
+        import cProfile
+        profile = cProfile.Profile()
+        profile.runcall(self._dispatch)
+        profile.dump_stats(self.args.cprofile)
+
+    def _dispatch(self):
+        mode = self.mode_of[self.args.mode]
+        if mode == "init":
+            self._handle_init(self.load_index(), self.args.script)
+        elif mode == "print":
+            self._handle_print(self.load_index(), self.args.name)
+        elif mode == "create":
+            self._handle_create_overwrite_paths(self.load_index(), self.args.name, self.args.filepath)
+        elif mode == "overwrite":
+            self._handle_create_overwrite_paths(self.load_index(), self.args.name, self.args.filepath, overwrite=True)
+        elif mode == "rename":
+            self._handle_rename(self.load_index(), self.args.name[0], self.args.name[1])
+        elif mode == "dump" and self.args.pack:
+            self._handle_export_pack(self.load_index(), self.args.name, self.args.pack)
+        elif mode == "dump" and not self.args.name:
+            self.logger.error("A name is required unless --pack is given! {}".format(self.fmt.crossmark))
+        elif mode == "dump":
+            self._handle_export(self.load_index(), self.args.name, self.args.filepath)
+        elif mode == "list":
+            self._handle_list(self.load_index())
+        elif mode == "delete":
+            self._handle_delete(self.load_index(), self.args.name)
+        elif mode == "fix":
+            oneLinerDB = self.parse_doc()
+            if self.args.train_zdict:
+                self._handle_train_zdict(oneLinerDB)
             self.construct_doc(oneLinerDB)
             print("{}  Parsing and de-parsing the .one-liner file was successful! {}".
                   format(self.fmt.checkmark, self.fmt.thumbsup))
+        elif mode == "stats":
+            self._handle_stats(self.parse_doc())
+        elif mode == "search":
+            self._handle_search(self.load_index(), self.args.query)
+        elif mode == "server":
+            self._handle_server(self.args.verb)
+        elif mode == "sync":
+            self._handle_sync(self.args.dirpath)
+        elif mode == "verify":
+            self._handle_verify(self.load_index())
+        elif mode == "import":
+            self._handle_import_pack(self.load_index(), self.args.pack)
 
+    @_profiled("parse_doc")
     def parse_doc(self):
-        oneLinerDB = {"info_and_params": {"contents": ""}}
-        with open(self.one_liner_alias_file, 'r', encoding='utf-8') as file:
-            saving_info_and_params = True
-            pre_comments = entire_alias = post_comments = ""
-
+        import re
+        oneLinerDB = {"info_and_params": {"contents": "", "duplicates": []}}
+        with open(self.one_liner_alias_file, 'rb') as file:
             lines = file.readlines()
-            lines.append("")
-            for i, line in enumerate(lines):
-                stripped_line = line.strip("\n").strip(" ")
+        lines.append(b"")
+
+        saving_info_and_params = True
+        info_and_params = []
+        pre_comments, entire_alias, post_comments = [], "", []
+        # byte offsets of the current line and of the first line of the current one-liner's block
+        offset = block_start = 0
+        for i, line in enumerate(lines):
+            stripped_line = line.decode('utf-8').strip("\n").strip(" ")
 
-                if saving_info_and_params:
-                    oneLinerDB["info_and_params"]["contents"] += stripped_line + "\n"
+            if saving_info_and_params:
+                info_and_params.append(stripped_line)
+            else:
+                if (len(stripped_line) == 0 or i == len(lines) - 1 or stripped_line.startswith("alias ")) and \
+                        (len(entire_alias) > 0):
+                    alias_name = entire_alias.lstrip("alias").split("=")[0].strip(" ")
+                    if alias_name in oneLinerDB:
+                        oneLinerDB["info_and_params"]["duplicates"].append(alias_name)
+
+                    oneLinerDB[alias_name] = {"entire_line": entire_alias,
+                                              "comments": ["\n".join(pre_comments).strip("\n"),
+                                                           "\n".join(post_comments).strip("\n")],
+                                              "span": [block_start, offset - block_start]
+                                              }
+                    pre_comments, entire_alias, post_comments = [], "", []
+                    if stripped_line.startswith("alias "):
+                        entire_alias = stripped_line
+                        block_start = offset
                 else:
-                    if (len(stripped_line) == 0 or i == len(lines) - 1 or stripped_line.startswith("alias ")) and \
-                            (len(entire_alias) > 0):
-                        alias_name = entire_alias.lstrip("alias").split("=")[0].strip(" ")
-
-                        if not stripped_line.startswith("alias "):
-                            post_comments += stripped_line
-                        post_comments = post_comments.strip("\n")
-                        oneLinerDB[alias_name] = {"entire_line": entire_alias,
-                                                  "comments": [pre_comments.strip("\n"),
-                                                               post_comments.strip("\n")]
-                                                  }
-                        pre_comments = entire_alias = post_comments = ""
-                        if stripped_line.startswith("alias "):
-                            entire_alias = stripped_line
-                    else:
-                        if re.search("^alias( +)[a-zA-Z0-9-_]+=('.*'|\".*\")$", stripped_line):
-                            entire_alias = stripped_line
-                        elif len(entire_alias) == 0:
-                            pre_comments += stripped_line + "\n"
-                        elif len(entire_alias) > 0:
-                            post_comments += stripped_line + "\n"
+                    if re.search(self.alias_regex, stripped_line):
+                        entire_alias = stripped_line
+                        if len(pre_comments) == 0:
+                            block_start = offset
+                    elif len(entire_alias) == 0:
+                        if len(pre_comments) == 0:
+                            block_start = offset
+                        pre_comments.append(stripped_line)
+                    elif len(entire_alias) > 0:
+                        post_comments.append(stripped_line)
 
-                    if len(stripped_line) == 0:
-                        pre_comments = ""
+                if len(stripped_line) == 0:
+                    pre_comments = []
 
-                if stripped_line.startswith("# PARAMETERS END"):
-                    saving_info_and_params = False
-                    oneLinerDB["info_and_params"]["contents"] = oneLinerDB["info_and_params"]["contents"].rstrip("\n")
+            if saving_info_and_params and stripped_line.startswith("# PARAMETERS END"):
+                saving_info_and_params = False
+                oneLinerDB["info_and_params"]["contents"] = "\n".join(info_and_params).rstrip("\n")
+            offset += len(line)
 
+        if saving_info_and_params:
+            oneLinerDB["info_and_params"]["contents"] = "\n".join(info_and_params) + "\n"
         return oneLinerDB
 
+    @_profiled("construct_doc")
     def construct_doc(self, oneLinerDB):
-        with open(self.one_liner_alias_file, 'w', encoding='utf-8') as file:
-            file.write(oneLinerDB["info_and_params"]["contents"] + "\n")
-            oneLinerDB.pop("info_and_params")
-
-            sorted_one_liners = sorted(oneLinerDB.keys())
-            sorted_one_liners.remove("one-liner")
-            sorted_one_liners.insert(0, "one-liner")
-            for one_liner in sorted_one_liners:
-                one_liner_payload = ""
-                if oneLinerDB[one_liner]["comments"][0]:
-                    one_liner_payload += oneLinerDB[one_liner]["comments"][0] + "\n"
-                one_liner_payload += oneLinerDB[one_liner]["entire_line"] + "\n"
-                if oneLinerDB[one_liner]["comments"][1]:
-                    one_liner_payload += oneLinerDB[one_liner]["comments"][1] + "\n"
-
-                file.write("\n" + one_liner_payload + "\n")
-
-    def _handle_init(self, oneLinerDB, script):
+        oneLinerIndex = {}
+        doc = [(oneLinerDB["info_and_params"]["contents"] + "\n").encode('utf-8')]
+        offset = len(doc[0])
+        oneLinerDB.pop("info_and_params")
+
+        sorted_one_liners = sorted(oneLinerDB.keys())
+        sorted_one_liners.remove("one-liner")
+        sorted_one_liners.insert(0, "one-liner")
+        for one_liner in sorted_one_liners:
+            one_liner_payload = self._entry_text(oneLinerDB[one_liner]).encode('utf-8')
+            oneLinerIndex[one_liner] = [offset + 1, len(one_liner_payload),
+                                        self._payload_hash_of(oneLinerDB[one_liner]["entire_line"])]
+            doc.append(b"\n" + one_liner_payload + b"\n")
+            offset += len(doc[-1])
+
+        self._save_index(oneLinerIndex, self._write_doc(b"".join(doc)))
+        self._collect_blobs(oneLinerDB)
+
+    def _write_doc(self, doc):
+        # write to a temporary file and atomically move it in place, a shell sourcing the .one-liner file
+        # concurrently sees either the old or the new file but never a truncated one
+        import tempfile
+        doc_path = os.path.realpath(self.one_liner_alias_file)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(doc_path), prefix=os.path.basename(doc_path) + ".")
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(doc)
+                file.flush()
+                os.fsync(file.fileno())
+                if os.path.exists(doc_path):
+                    os.fchmod(file.fileno(), stat.S_IMODE(os.stat(doc_path).st_mode))
+                doc_stat = os.fstat(file.fileno())
+            os.replace(tmp_path, doc_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return doc_stat
+
+    @_profiled("append_doc")
+    def _append_doc(self, oneLinerIndex, name, entry):
+        # journal: the entry is appended to the end of the .one-liner file, the later alias wins when it is sourced
+        # and 'fix' compacts the file back
+        block = self._entry_text(entry).encode('utf-8')
+        with open(self.one_liner_alias_file, 'ab') as file:
+            offset = file.tell() + 1
+            file.write(b"\n" + block + b"\n")
+            file.flush()
+            os.fsync(file.fileno())
+            doc_stat = os.fstat(file.fileno())
+
+        spliceable = self.one_liner_index["spliceable"] and name not in oneLinerIndex
+        oneLinerIndex = dict(oneLinerIndex)
+        oneLinerIndex[name] = [offset, len(block), self._payload_hash_of(entry["entire_line"])]
+        self._save_index(oneLinerIndex, doc_stat, spliceable=spliceable)
+
+    def update_doc(self, changes, journal=False):
+        # a single change is spliced into the file using the index, the rest goes through parse_doc and construct_doc
+        if journal and all(entry is not None for entry in changes.values()):
+            for name, entry in changes.items():
+                self._append_doc(self.load_index(), name, entry)
+            return
+        if len(changes) == 1:
+            oneLinerIndex = self.load_index()
+            if self.one_liner_index["spliceable"]:
+                self._splice_doc(oneLinerIndex, *list(changes.items())[0])
+                return
+        oneLinerDB = self.parse_doc()
+        for name, entry in changes.items():
+            if entry is None:
+                oneLinerDB.pop(name, None)
+            else:
+                oneLinerDB[name] = entry
+        self.construct_doc(oneLinerDB)
+
+    @staticmethod
+    def _entry_text(entry):
+        one_liner_payload = ""
+        if entry["comments"][0]:
+            one_liner_payload += entry["comments"][0] + "\n"
+        one_liner_payload += entry["entire_line"] + "\n"
+        if entry["comments"][1]:
+            one_liner_payload += entry["comments"][1] + "\n"
+        return one_liner_payload
+
+    @_profiled("load_index")
+    def load_index(self):
+        # {name: [offset, length, payload hash]}, rebuilt whenever the mtime or the size of the .one-liner file changes
+        doc_stat = os.stat(self.one_liner_alias_file)
+        if self.one_liner_index is None or self.one_liner_index["stat"] != [doc_stat.st_mtime_ns, doc_stat.st_size]:
+            try:
+                with open(self.one_liner_index_file, 'rb') as file:
+                    self.one_liner_index = marshal.load(file)
+            except (OSError, EOFError, ValueError, TypeError):
+                self.one_liner_index = None
+            if not isinstance(self.one_liner_index, dict) or \
+                    self.one_liner_index.get("stat") != [doc_stat.st_mtime_ns, doc_stat.st_size]:
+                self.logger.debug("Rebuilding the index of the .one-liner file")
+                # stat is taken before parsing, a concurrent rewrite only makes the index stale, never wrong
+                oneLinerDB = self.parse_doc()
+                info_and_params = oneLinerDB.pop("info_and_params")
+                oneLinerIndex = {name: entry["span"] + [self._payload_hash_of(entry["entire_line"])]
+                                 for name, entry in oneLinerDB.items()}
+                # a one-liner that is defined more than once can't be spliced by its offset
+                self._save_index(oneLinerIndex, doc_stat, spliceable=not info_and_params["duplicates"])
+        return self.one_liner_index["entries"]
+
+    def _save_index(self, oneLinerIndex, doc_stat, spliceable=True):
+        self.one_liner_index = {"stat": [doc_stat.st_mtime_ns, doc_stat.st_size], "spliceable": spliceable,
+                                "entries": oneLinerIndex}
+        try:
+            with open(self.one_liner_index_file + "." + str(os.getpid()), 'wb') as file:
+                marshal.dump(self.one_liner_index, file)
+            os.replace(self.one_liner_index_file + "." + str(os.getpid()), self.one_liner_index_file)
+        except OSError:
+            self.logger.debug("Couldn't save the index of the .one-liner file")
+
+    @_profiled("splice_doc")
+    def _splice_doc(self, oneLinerIndex, name, entry):
+        with open(self.one_liner_alias_file, 'rb') as file:
+            doc = file.read()
+        block = self._entry_text(entry).encode('utf-8') if entry is not None else b""
+
+        if name in oneLinerIndex:
+            offset, end = oneLinerIndex[name][0], oneLinerIndex[name][0] + oneLinerIndex[name][1]
+            old_entry = self._parse_entry(doc[offset:end].decode('utf-8'))
+            if entry is None:
+                # also remove the blank lines that separate it from the next one-liner
+                following = [o for o, _, _ in oneLinerIndex.values() if o > offset]
+                end = min(following) if following else len(doc)
+                if not following and doc[offset - 2:offset] == b"\n\n":
+                    offset -= 1
+        else:
+            old_entry = None
+            # keep the order of construct_doc: the one-liner tool first and then the rest sorted by name
+            following = [o for n, (o, _, _) in oneLinerIndex.items()
+                         if n != "one-liner" and (name == "one-liner" or n > name)]
+            if following:
+                offset = end = min(following)
+                block += b"\n\n"
+            else:
+                offset = end = len(doc)
+                block = (b"\n" if doc.endswith(b"\n") else b"\n\n") + block + b"\n"
+
+        doc = doc[:offset] + block + doc[end:]
+        doc_stat = self._write_doc(doc)
+
+        delta = len(block) - (end - offset)
+        oneLinerIndex = {n: [o + delta if o >= end else o, l, h] for n, (o, l, h) in oneLinerIndex.items() if n != name}
+        if entry is not None:
+            entry_text = self._entry_text(entry).encode('utf-8')
+            oneLinerIndex[name] = [offset + block.index(entry_text), len(entry_text),
+                                   self._payload_hash_of(entry["entire_line"])]
+        self._save_index(oneLinerIndex, doc_stat)
+
+        # remove the blob of the old one-liner if nothing else references it, an inline one-liner of the same payload
+        # has the same hash but doesn't reference the blob
+        blob_hash = self._blob_ref(old_entry["entire_line"]) if old_entry else None
+        referenced = [self._blob_ref(self._parse_entry(doc[o:o + l].decode('utf-8'))["entire_line"])
+                      for o, l, h in oneLinerIndex.values() if h == blob_hash] if blob_hash else []
+        if blob_hash and blob_hash not in referenced and blob_hash not in self._quarantined_blobs():
+            self.logger.debug("Removing the unreferenced blob '{}'".format(blob_hash))
+            os.remove(os.path.join(self.one_liner_blob_dir, blob_hash))
+
+    def _read_entry(self, oneLinerIndex, name):
+        offset, length = oneLinerIndex[name][:2]
+        with open(self.one_liner_alias_file, 'rb') as file:
+            doc_stat = os.fstat(file.fileno())
+            if self.one_liner_index["stat"] != [doc_stat.st_mtime_ns, doc_stat.st_size]:
+                # the .one-liner file was replaced after the index was loaded
+                return self._read_entry(self.load_index(), name)
+            file.seek(offset)
+            return self._parse_entry(file.read(length).decode('utf-8'))
+
+    def _parse_entry(self, block):
+        lines = [line.strip(" ") for line in block.strip("\n").split("\n")]
+        alias_lines = [i for i, line in enumerate(lines) if line.startswith("alias ")]
+        if len(alias_lines) > 1:
+            # a malformed alias line in the comments, only the regex tells them apart
+            import re
+            alias_lines = [i for i in alias_lines if re.search(self.alias_regex, lines[i])] or alias_lines
+        return {"entire_line": lines[alias_lines[0]],
+                "comments": ["\n".join(lines[:alias_lines[0]]), "\n".join(lines[alias_lines[0] + 1:])]}
+
+    def _collect_blobs(self, oneLinerDB):
+        # remove the blobs that are no longer referenced by any one-liner
+        if not os.path.isdir(self.one_liner_blob_dir):
+            return
+        referenced = self._quarantined_blobs()
+        for one_liner in oneLinerDB.values():
+            referenced.add(self._blob_ref(one_liner.get("entire_line", "")))
+        for blob in os.listdir(self.one_liner_blob_dir):
+            if blob not in referenced:
+                self.logger.debug("Removing the unreferenced blob '{}'".format(blob))
+                os.remove(os.path.join(self.one_liner_blob_dir, blob))
+
+    def _quarantined_blobs(self):
+        # the blobs of the quarantined one-liners are kept so that they can be restored
+        try:
+            with open(self.one_liner_quarantine_file, 'r', encoding='utf-8') as file:
+                return {self._blob_ref(line) for line in file if line.startswith("alias ")}
+        except OSError:
+            return set()
+
+    def _handle_init(self, oneLinerIndex, script):
+        import re
         print("{} Initializing...".format(self.fmt.rocket))
 
-        self._handle_create_overwrite(oneLinerDB, "one-liner", script.encode('utf-8'), init=True)
+        self._handle_create_overwrite(oneLinerIndex, "one-liner", script.encode('utf-8'), init=True)
 
         # add the "source $HOME/.one-liner" to the .bashrc/.zshrc
         rc_file = "{}/.{}rc".format(os.environ["HOME"], os.environ["SHELL"].split("/")[-1])
@@ -259,33 +839,322 @@ class OneLiner:
         print("All set! {} You can start using one-liner after sourcing! {}".
               format(self.fmt.checkmark, self.fmt.lightning))
 
-    def _handle_print(self, oneLinerDB, name):
+    def _handle_print(self, oneLinerIndex, name):
         try:
-            oneLinerLine = oneLinerDB[name]["entire_line"]
+            oneLinerLine = self._read_entry(oneLinerIndex, name)["entire_line"]
             print("Below is the alias for the one-liner '{}' {}".format(self.fmt.bold_text(name), self.fmt.lookbelow))
             print("\n\t" + oneLinerLine + "\n")
         except KeyError:
             self.logger.error("This one-liner doesn't exist! {}".format(self.fmt.crossmark))
 
-    def _handle_create_overwrite(self, oneLinerDB, name, filepath, overwrite=False, init=False):
-        one_liner_name = name if name != "" else filepath.rstrip(".py").split("/")[-1]
+    def _handle_create_overwrite_paths(self, oneLinerIndex, name, filepaths, overwrite=False):
+        # the first argument is a path if it exists, is a glob or can't be an alias name, e.g. 'one-liner create
+        # scripts/*.py' or 'one-liner create tool1 tool2' for two scripts without an extension
+        import re
+        if not self._check_codec():
+            return
+        if name and (os.path.exists(name) or re.search(r"[*?[]", name) or not re.search(self.name_regex, name)):
+            name, filepaths = "", [name] + filepaths
+        if self.args.alias_name:
+            if name:
+                self.logger.error("The name is given twice, '{}' and --name '{}'! {}".
+                                  format(name, self.args.alias_name, self.fmt.crossmark))
+                return
+            if not re.search(self.name_regex, self.args.alias_name):
+                self.logger.error("'{}' can't be an alias name! {}".format(self.args.alias_name, self.fmt.crossmark))
+                return
+            name = self.args.alias_name
+        if len(filepaths) == 1 and not os.path.isdir(filepaths[0]) and not re.search(r"[*?[]", filepaths[0]):
+            self._handle_create_overwrite(oneLinerIndex, name, filepaths[0], overwrite=overwrite)
+        elif name:
+            self.logger.error("A name can only be given for a single script! {}".format(self.fmt.crossmark))
+        else:
+            self._handle_batch_create_overwrite(oneLinerIndex, self._expand_paths(filepaths), overwrite=overwrite)
+
+    @staticmethod
+    def _expand_paths(filepaths):
+        import glob
+        import re
+        expanded = []
+        for filepath in filepaths:
+            if re.search(r"[*?[]", filepath):
+                expanded += sorted(path for path in glob.glob(filepath, recursive=True) if os.path.isfile(path))
+            elif os.path.isdir(filepath):
+                expanded += sorted(glob.glob(os.path.join(filepath, "**", "*.py"), recursive=True))
+            else:
+                expanded.append(filepath)
+        return expanded
+
+    @staticmethod
+    def _one_liner_name(filepath):
+        return os.path.splitext(os.path.basename(filepath))[0]
+
+    def _handle_batch_create_overwrite(self, oneLinerIndex, filepaths, overwrite=False):
+        # encode every script across the process pool, then check the conflicts and write the .one-liner file once
+        results = self._pool_map("_encode_file", filepaths)
+
+        changes = {}
+        for result in results:
+            if "error" in result:
+                continue
+            entire_line = result.pop("entire_line")
+            if result["name"] in changes:
+                result["error"] = "the name '{}' is already used by another script in this batch".format(result["name"])
+                continue
+            changes[result["name"]] = {"entire_line": entire_line, "comments": ['', '']}
+            result["action"] = "overwritten" if result["name"] in oneLinerIndex else "created"
+
+        self._approve_conflicts(oneLinerIndex, changes, overwrite)
+        if changes:
+            self.update_doc(changes, journal=self.args.journal)
+
+        if self.args.json:
+            import json
+            print(json.dumps(results, indent=2))
+        else:
+            for result in results:
+                if "error" in result:
+                    self.logger.error("{} '{}': {} {}".format(result["path"], result.get("name", ""),
+                                                              result["error"], self.fmt.crossmark))
+                else:
+                    print("{} one-liner '{}' from {} {}".format(result["action"].capitalize(),
+                                                               self.fmt.bold_text(result["name"]), result["path"],
+                                                               self.fmt.checkmark))
+            if changes:
+                self._source()
+        if any("error" in result for result in results):
+            raise SystemExit(1)
+
+    def _check_codec(self):
+        # False if nothing can be encoded with --codec, called before _pool_map so that the workers inherit the results
+        if self.args.codec == "zdict" and not self._zdicts():
+            self.logger.error("There is no compression dictionary yet, run 'one-liner fix --train-zdict' first {}".
+                              format(self.fmt.crossmark))
+            return False
+        if self.args.codec == "auto":
+            self._import_times()
+        return True
+
+    def _approve_conflicts(self, oneLinerIndex, names, overwrite=False):
+        # create expects new one-liners and overwrite existing ones, the others need an approval
+        conflicts = [name for name in names if (name in oneLinerIndex) != overwrite]
+        if conflicts:
+            statement = "The one-liner(s) {} already exist and will be {}" if not overwrite else \
+                "The one-liner(s) {} do not exist and new ones will be {}"
+            self._ask_approval((statement + " {}").format(", ".join(self.fmt.bold_text(name) for name in conflicts),
+                                                          self.fmt.bold_text("overridden" if not overwrite else
+                                                                             "created"), self.fmt.warning))
+
+    def _encode_file(self, filepath):
+        import re
+        result = {"path": filepath, "name": self._one_liner_name(filepath)}
+        if not re.search(self.name_regex, result["name"]):
+            result["error"] = "'{}' can't be an alias name, rename the script".format(result["name"])
+            return result
+        try:
+            with open(filepath, encoding='utf-8') as file:
+                byte_array = file.read().encode('utf-8')
+            payload, codec = self._encode_payload(byte_array, self.args.payload, self.args.codec)
+            result["entire_line"] = self._alias_line(result["name"], payload, store=self.args.store,
+                                                     kind=self.args.payload, codec=codec,
+                                                     launcher=self.args.launcher)
+            result["codec"] = codec
+        except (OSError, ValueError, SyntaxError) as e:
+            result["error"] = str(e)
+        return result
+
+    def _handle_sync(self, dirpath):
+        # one stat walk over the directory, the scripts are only hashed when their stat changed since the last sync and
+        # the .one-liner file is only parsed when a hash or the .one-liner file changed
+        import hashlib
+        import re
+        sync_dir = os.path.realpath(dirpath)
+        if not os.path.isdir(sync_dir):
+            self.logger.error("'{}' is not a directory! {}".format(dirpath, self.fmt.crossmark))
+            return
+        if not self._check_codec():
+            return
+        sync_state = self._load_sync_state()
+        dir_state = sync_state.get(sync_dir, {"stat": None, "files": {}, "stale": {}, "errors": []})
+
+        files = {}
+        for filepath in self._expand_paths([sync_dir]):
+            file_stat = os.stat(filepath)
+            cached = dir_state["files"].get(filepath)
+            if cached and cached[:2] == [file_stat.st_mtime_ns, file_stat.st_size]:
+                files[filepath] = cached
+                continue
+            with open(filepath, 'rb') as file:
+                files[filepath] = [file_stat.st_mtime_ns, file_stat.st_size, hashlib.sha256(file.read()).hexdigest()]
+
+        doc_stat = os.stat(self.one_liner_alias_file)
+        if files == dir_state["files"] and dir_state["stat"] == [doc_stat.st_mtime_ns, doc_stat.st_size] and \
+                not (self.args.prune and dir_state["stale"]):
+            self.logger.debug("Nothing changed since the last sync")
+            self._print_sync_results(dir_state.get("errors", []) +
+                                     [{"path": filepath, "name": name, "action": "stale"}
+                                      for name, filepath in sorted(dir_state["stale"].items())], len(files))
+            return
+
+        with self.profiler.phase("sync"):
+            oneLinerDB = self.parse_doc()
+            # the one-liners synced from this directory before, name -> script
+            synced = {name: marker[0] for name, marker in
+                      ((name, self._sync_marker_of(entry)) for name, entry in oneLinerDB.items()
+                       if name != "info_and_params") if marker and marker[0].startswith(sync_dir + os.sep)}
+
+            results, changed, names = [], [], {}
+            for filepath, (_, _, sha256) in sorted(files.items()):
+                name = self._one_liner_name(filepath)
+                if not re.search(self.name_regex, name):
+                    results.append({"path": filepath, "name": name,
+                                    "error": "'{}' can't be an alias name, rename the script".format(name)})
+                    continue
+                if name == "one-liner" or name in names:
+                    results.append({"path": filepath, "name": name,
+                                    "error": "the name '{}' is already used by {}".format(
+                                        name, "the one-liner tool" if name == "one-liner" else names[name])})
+                    continue
+                names[name] = filepath
+                if self._sync_marker_of(oneLinerDB.get(name)) != (filepath, sha256):
+                    changed.append(filepath)
+            stale = sorted(name for name in synced if name not in names)
+
+            conflicts = [self._one_liner_name(filepath) for filepath in changed
+                         if self._one_liner_name(filepath) in oneLinerDB and
+                         self._one_liner_name(filepath) not in synced]
+            if conflicts:
+                self._ask_approval("The one-liner(s) {} weren't synced from {} and will be {} {}".format(
+                    ", ".join(self.fmt.bold_text(name) for name in conflicts), dirpath,
+                    self.fmt.bold_text("overridden"), self.fmt.warning))
+            if self.args.prune and stale:
+                self._ask_approval("The one-liner(s) {} will be {} {}".format(
+                    ", ".join(self.fmt.bold_text(name) for name in stale), self.fmt.bold_text("pruned"),
+                    self.fmt.warning))
+
+            for result in self._pool_map("_encode_file", changed):
+                if "error" in result:
+                    results.append(result)
+                    continue
+                name, filepath = result["name"], result["path"]
+                # the comments of an existing one-liner are kept, only its sync marker is replaced
+                entry = oneLinerDB.get(name, {"comments": ['', '']})
+                comments = [line for line in entry["comments"][0].split("\n")
+                            if line and not self._sync_marker_of({"comments": [line, '']})]
+                comments.append(self.sync_marker.format(filepath, files[filepath][2]))
+                result["action"] = "updated" if name in oneLinerDB else "created"
+                oneLinerDB[name] = {"entire_line": result.pop("entire_line"),
+                                    "comments": ["\n".join(comments), entry["comments"][1]]}
+                results.append(result)
+            for name in stale:
+                if self.args.prune:
+                    oneLinerDB.pop(name)
+                results.append({"path": synced[name], "name": name,
+                                "action": "pruned" if self.args.prune else "stale"})
+
+            if any(result.get("action") in ["created", "updated", "pruned"] for result in results):
+                self.construct_doc(oneLinerDB)
+            doc_stat = os.stat(self.one_liner_alias_file)
+            # the scripts that failed are kept in the state too and reported from it until they or the .one-liner file
+            # change, the same scripts would fail again
+            sync_state[sync_dir] = {"stat": [doc_stat.st_mtime_ns, doc_stat.st_size], "files": files,
+                                    "stale": {} if self.args.prune else {name: synced[name] for name in stale},
+                                    "errors": [result for result in results if "error" in result]}
+            self._save_sync_state(sync_state)
+
+        self._print_sync_results(results, len(files))
+
+    def _print_sync_results(self, results, scripts):
+        if self.args.json:
+            import json
+            print(json.dumps(results, indent=2))
+            return
+        for result in results:
+            if "error" in result:
+                self.logger.error("{} '{}': {} {}".format(result["path"], result["name"], result["error"],
+                                                          self.fmt.crossmark))
+            elif result["action"] == "stale":
+                self.logger.warning("The script of the one-liner '{}' was removed from the directory, add --prune to "
+                                    "delete it {}".format(self.fmt.bold_text(result["name"]), self.fmt.warning))
+            else:
+                print("{} one-liner '{}' from {} {}".format(result["action"].capitalize(),
+                                                           self.fmt.bold_text(result["name"]), result["path"],
+                                                           self.fmt.checkmark))
+        changes = [result for result in results if result.get("action") in ["created", "updated", "pruned"]]
+        print("{} {} script(s) synced, {} one-liner(s) changed {}".format(
+            self.fmt.checkmark, scripts, len(changes), self.fmt.bang if changes else self.fmt.thumbsup))
+        if changes:
+            self._source()
+
+    def _sync_marker_of(self, entry):
+        # (script, hash) of a one-liner created by sync, None for the rest
+        import re
+        for line in (entry["comments"][0].split("\n") if entry else []):
+            marker = re.search(self.sync_marker_regex, line)
+            if marker:
+                return marker.group(1), marker.group(2)
+        return None
+
+    def _load_sync_state(self):
+        try:
+            with open(self.one_liner_sync_file, 'rb') as file:
+                sync_state = marshal.load(file)
+            return sync_state if isinstance(sync_state, dict) else {}
+        except (OSError, EOFError, ValueError, TypeError):
+            return {}
+
+    def _save_sync_state(self, sync_state):
+        try:
+            with open(self.one_liner_sync_file + "." + str(os.getpid()), 'wb') as file:
+                marshal.dump(sync_state, file)
+            os.replace(self.one_liner_sync_file + "." + str(os.getpid()), self.one_liner_sync_file)
+        except OSError:
+            self.logger.debug("Couldn't save the sync state")
+
+    @_profiled("pool")
+    def _pool_map(self, method, jobs):
+        # the workers are forked so that they inherit this instance, the jobs run serially where fork isn't available
+        global _pool_one_liner
+        if len(jobs) > 1:
+            import multiprocessing
+            if "fork" in multiprocessing.get_all_start_methods():
+                _pool_one_liner = self
+                with multiprocessing.get_context("fork").Pool(min(len(jobs), os.cpu_count() or 1)) as pool:
+                    return pool.map(_pool_worker, [(method, job) for job in jobs])
+        return [getattr(self, method)(job) for job in jobs]
+
+    def _handle_create_overwrite(self, oneLinerIndex, name, filepath, overwrite=False, init=False):
+        import re
+        one_liner_name = name if name != "" else self._one_liner_name(filepath)
+        if not re.search(self.name_regex, one_liner_name):
+            self.logger.error("'{}' can't be an alias name, give one with --name! {}".
+                              format(one_liner_name, self.fmt.crossmark))
+            return
 
         byte_array = filepath if init else open(filepath, encoding='utf-8').read().encode('utf-8')
 
-        base64_zlib_result = base64.b64encode(zlib.compress(byte_array, 9)).decode("utf-8")
-        one_liner = "alias {}='{} -c \"import base64; import zlib; decoded_string = zlib.decompress(base64.b64decode(" \
-                    "b'\"'\"'{}'\"'\"')).decode(); exec(decoded_string)\"'".format(one_liner_name,
-                                                                                   self.one_liner_python_exec,
-                                                                                   base64_zlib_result)
+        # the one-liner tool itself is always kept inline so that it works without the blob directory. Its code object
+        # is cached on the first call so that the modes don't decode and compile the whole tool every time, but it
+        # isn't embedded as that would quadruple the length of the alias line
+        kind = "bytecode" if init else self.args.payload
+        try:
+            payload, codec = self._encode_payload(byte_array, kind, "zlib" if init else self.args.codec,
+                                                  precompile=not init)
+        except SyntaxError as e:
+            self.logger.error("The script can't be compiled: {} {}".format(e, self.fmt.crossmark))
+            return
+        one_liner = self._alias_line(one_liner_name, payload, store="inline" if init else self.args.store,
+                                     kind=kind, codec=codec, launcher="inline" if init else self.args.launcher)
         # check for the conflicts between the mode selected and the provided args
-        mode_args_no_conflict = ((one_liner_name not in oneLinerDB.keys()) and not overwrite) or \
-                             ((one_liner_name in oneLinerDB.keys()) and (overwrite))
-        # edit the temporary DB object but hold to check mode
-        oneLinerDB[one_liner_name] = {"entire_line": one_liner,
-                                      "comments": ['', "{} sync below {}".format("#" * 10, "#" * 10) if init else '']}
+        mode_args_no_conflict = ((one_liner_name not in oneLinerIndex.keys()) and not overwrite) or \
+                             ((one_liner_name in oneLinerIndex.keys()) and (overwrite))
+        # hold the new entry to check mode
+        entry = {"entire_line": one_liner,
+                 "comments": ['', "{} sync below {}".format("#" * 10, "#" * 10) if init else '']}
         action = ""
+        journal = self.args.journal and not init
         if mode_args_no_conflict:
-            self.construct_doc(oneLinerDB)
+            self.update_doc({one_liner_name: entry}, journal=journal)
             action = "Creating" if not overwrite else "Overwriting"
         else:
             if init:
@@ -301,56 +1170,940 @@ class OneLiner:
                                    format(self.fmt.bold_text(one_liner_name), self.fmt.bold_text("overridden"),
                                           self.fmt.warning))
                 action = "Overwriting"
-            self.construct_doc(oneLinerDB)
+            self.update_doc({one_liner_name: entry}, journal=journal)
 
         print("{} one-liner '{}' is successful {}".format(action, self.fmt.bold_text(one_liner_name), self.fmt.bang))
         self._source()
 
-    def _handle_rename(self, oneLinerDB, old_name, new_name):
+    @_profiled("encode")
+    def _encode_payload(self, byte_array, kind="source", codec="zlib", precompile=True):
+        if kind == "bytecode":
+            # magic number + marshalled code object, the source is kept at the end for the other interpreters. Without
+            # precompile the code object is left out and the launcher compiles and caches it on the first call instead
+            code = marshal.dumps(compile(byte_array, '<string>', 'exec')) if precompile else b""
+            magic_number = MAGIC_NUMBER if precompile else bytes(len(MAGIC_NUMBER))
+            byte_array = magic_number + len(code).to_bytes(4, 'little') + code + byte_array
+        if codec == "auto":
+            codec = self._select_codec(byte_array)
+        return self._compress(byte_array, codec, self._latest_zdict()[1] if codec == "zdict" else None), codec
+
+    @staticmethod
+    def _compress(byte_array, codec, zdict=None):
+        if codec == "zdict":
+            compressor = zlib.compressobj(9, zdict=zdict)
+            return compressor.compress(byte_array) + compressor.flush()
+        elif codec.startswith("zlib"):
+            return zlib.compress(byte_array, int(codec[len("zlib-"):] or 9))
+        elif codec == "bz2":
+            import bz2
+            return bz2.compress(byte_array, 9)
+        elif codec == "lzma":
+            import lzma
+            return lzma.compress(byte_array, preset=9 | lzma.PRESET_EXTREME)
+        return byte_array
+
+    @staticmethod
+    def _decompress(payload, codec, zdict=None):
+        if codec == "zdict":
+            return zlib.decompressobj(zdict=zdict).decompress(payload)
+        elif codec == "zlib":
+            return zlib.decompress(payload)
+        elif codec == "bz2":
+            import bz2
+            return bz2.decompress(payload)
+        elif codec == "lzma":
+            import lzma
+            return lzma.decompress(payload)
+        return bytes(payload)
+
+    @staticmethod
+    def _codec_of(entire_line):
+        # the codec is tagged in the alias line by the module its payload is decompressed with
+        import re
+        if "ONELINER_ZDICT_" in entire_line:
+            return "zdict"
+        codec = re.search(r"(zlib|bz2|lzma)\.decompress\(", entire_line)
+        return codec.group(1) if codec else "none"
+
+    def _zdicts(self):
+        # read from the parameters at the top of the .one-liner file
+        if self.one_liner_zdicts is None:
+            import re
+            self.one_liner_zdicts = {}
+            with open(self.one_liner_alias_file, 'r', encoding='utf-8') as file:
+                for line in file:
+                    if line.startswith("# PARAMETERS END"):
+                        break
+                    zdict = re.search(self.zdict_regex, line.strip())
+                    if zdict:
+                        self.one_liner_zdicts[int(zdict.group(1))] = binascii.a2b_base64(zdict.group(2))
+        return self.one_liner_zdicts
+
+    def _latest_zdict(self):
+        # (version, dictionary) that the new '--codec zdict' one-liners are encoded with
+        zdicts = self._zdicts()
+        return (max(zdicts), zdicts[max(zdicts)]) if zdicts else (None, None)
+
+    @staticmethod
+    def _zdict_version(entire_line):
+        import re
+        version = re.search(r"\$ONELINER_ZDICT_([0-9]+)", entire_line)
+        return int(version.group(1)) if version else None
+
+    def _zdict_of(self, entire_line):
+        version = self._zdict_version(entire_line)
+        return self._zdicts().get(version) if version is not None else None
+
+    @staticmethod
+    def _train_zdict(sources, size):
+        # the lines that at least two scripts have in common, weighted by the bytes they would save. zlib reaches
+        # the end of the dictionary with the shortest distances, so the most valuable lines are kept at the end
+        counts = {}
+        for source in sources:
+            for line in set(source.splitlines(keepends=True)):
+                counts[line] = counts.get(line, 0) + 1
+        shared = sorted((count * len(line), line) for line, count in counts.items() if count > 1 and line.strip())
+        zdict = []
+        for _, line in reversed(shared):
+            if len(line.encode('utf-8')) <= size:
+                zdict.insert(0, line.encode('utf-8'))
+                size -= len(zdict[0])
+        return b"".join(zdict)
+
+    def _handle_train_zdict(self, oneLinerDB):
+        sources = {}
+        for name, entry in oneLinerDB.items():
+            if name in ["info_and_params", "one-liner"]:
+                continue
+            try:
+                sources[name] = self._decode_source(entry["entire_line"])
+            except (AttributeError, ValueError, OSError, zlib.error):
+                self.logger.debug("Skipping '{}', it wasn't created by one-liner".format(name))
+
+        zdict = self._train_zdict(sources.values(), self.args.zdict_size)
+        if not zdict:
+            self.logger.warning("The one-liners don't have any lines in common, nothing to train on {}".
+                                format(self.fmt.warning))
+            return
+        version = max(self._zdicts(), default=0) + 1
+        self.one_liner_zdicts[version] = zdict
+
+        # re-encode across the process pool, a one-liner keeps its payload if the dictionary doesn't make it smaller
+        entire_lines = self._pool_map("_reencode_zdict", [(name, oneLinerDB[name]["entire_line"], source)
+                                                          for name, source in sources.items()])
+        for name, entire_line in zip(sources, entire_lines):
+            oneLinerDB[name]["entire_line"] = entire_line
+
+        # only keep the dictionaries that are still referenced
+        referenced = {self._zdict_version(entry["entire_line"]) for name, entry in oneLinerDB.items()
+                      if name != "info_and_params"}
+        self._set_zdict_params(oneLinerDB, {v: d for v, d in self.one_liner_zdicts.items() if v in referenced})
+
+        print("{} Trained a {} bytes compression dictionary, {} of {} one-liners are encoded with it".
+              format(self.fmt.writing, len(zdict),
+                     len([line for line in entire_lines if self._zdict_version(line) == version]), len(entire_lines)))
+
+    def _set_zdict_params(self, oneLinerDB, zdicts):
+        # replace the dictionaries in the parameters of the .one-liner file
+        import re
+        lines = [line for line in oneLinerDB["info_and_params"]["contents"].split("\n")
+                 if not re.search(self.zdict_regex, line)]
+        end = lines.index("# PARAMETERS END") if "# PARAMETERS END" in lines else len(lines)
+        lines[end:end] = ['ONELINER_ZDICT_{}="{}"'.format(v, binascii.b2a_base64(d, newline=False).decode())
+                          for v, d in sorted(zdicts.items())]
+        oneLinerDB["info_and_params"]["contents"] = "\n".join(lines)
+
+    def _reencode_zdict(self, job):
+        name, entire_line, source = job
+        kind = "bytecode" if "MAGIC_NUMBER" in entire_line else "source"
+        try:
+            payload, codec = self._encode_payload(source.encode('utf-8'), kind, "zdict")
+        except SyntaxError:
+            return entire_line
+        if len(payload) >= len(self._read_payload(entire_line)):
+            return entire_line
+        return self._alias_line(name, payload, store="blob" if self._blob_ref(entire_line) else "inline", kind=kind,
+                                codec=codec, launcher=self._launcher_of(entire_line))
+
+    def _import_times(self):
+        # import time of the decompression modules in the interpreter that runs the one-liners, measured once per
+        # invocation. Called before _pool_map so that the workers inherit it instead of measuring it again
+        if self.import_times is None:
+            import subprocess
+            self.import_times = {}
+            try:
+                import_log = subprocess.run([self.one_liner_python_exec, "-X", "importtime", "-c",
+                                             "import zlib, bz2, lzma"],
+                                            stderr=subprocess.PIPE, universal_newlines=True, timeout=10).stderr
+                for line in import_log.splitlines()[1:]:
+                    fields = line.split("|")
+                    self.import_times[fields[-1].strip()] = int(fields[1]) / 1000
+            except (OSError, subprocess.SubprocessError, ValueError, IndexError):
+                self.logger.debug("Couldn't measure the import times, only the decode times are compared")
+        return self.import_times
+
+    def _select_codec(self, byte_array):
+        import_times = self._import_times()
+        candidates = []
+        zdict = self._latest_zdict()[1]
+        for codec in [codec for codec in self.codecs if codec != "zlib" and (codec != "zdict" or zdict)]:
+            payload = self._compress(byte_array, codec, zdict)
+            module = "zlib" if codec == "zdict" else codec.split("-")[0]
+            runs, start = 0, time.perf_counter()
+            while time.perf_counter() - start < 0.02:
+                self._decompress(payload, codec.split("-")[0], zdict)
+                runs += 1
+            decode_time = (time.perf_counter() - start) * 1000 / runs + import_times.get(module, 0)
+            self.logger.debug("codec: {:7s} size: {:8d} decode: {:.3f} ms".format(codec, len(payload), decode_time))
+            candidates.append((decode_time > self.args.decode_budget, len(payload), decode_time, codec))
+        # the smallest payload within the budget, or the fastest one if nothing fits in it
+        within_budget = [candidate for candidate in candidates if not candidate[0]]
+        codec = min(within_budget)[3] if within_budget else min(candidates, key=lambda candidate: candidate[2])[3]
+        self.logger.debug("Selected the codec '{}'".format(codec))
+        return codec
+
+    def _alias_line(self, name, payload, store="inline", kind="source", codec="zlib", launcher="inline",
+                    zdict_version=None):
+        module = "zlib" if codec == "zdict" else codec.split("-")[0]
+        decompress = module + ".decompress" if module != "none" else "bytes"
+        import_module = "import {}; ".format(module) if module != "none" else ""
+        if codec == "zdict":
+            # the shell expands the dictionary into the code when the alias is called
+            decompress = "zlib.decompressobj(zdict=binascii.a2b_base64(b'$ONELINER_ZDICT_{}')).decompress". \
+                format(zdict_version if zdict_version is not None else self._latest_zdict()[0])
+            import_module = "import binascii; " + import_module if store == "blob" else import_module
+        if store == "blob":
+            code = "import os; import mmap; " + import_module + \
+                   "f = open(os.environ['ONELINER_PATH'] + '.blobs/{}', 'rb'); ".format(self._write_blob(payload))
+            # an empty file can't be mapped, '--codec none' turns an empty script into an empty payload
+            payload_expr = "(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size " \
+                           "else b'')"
+        else:
+            code = "import binascii; " + import_module
+            # binascii rather than base64, importing base64 also imports re
+            payload_expr = "binascii.a2b_base64(b'{}')".format(binascii.b2a_base64(payload, newline=False).decode())
+
+        python_exec = self.one_liner_python_exec
+        if launcher == "server":
+            python_exec += " -S"
+            run = "exec(data.decode())"
+            if kind == "bytecode":
+                run = "try:\n    from _frozen_importlib_external import MAGIC_NUMBER\n" \
+                      "except ImportError:\n    from importlib.util import MAGIC_NUMBER\n" \
+                      "n = 8 + int.from_bytes(data[4:8], 'little')\n" \
+                      "exec(marshal.loads(data[8:n]) if data[:4] == MAGIC_NUMBER else " \
+                      "compile(data[n:], '<string>', 'exec'))"
+            template = self.server_launcher.format(precompiled=kind == "bytecode", run=run)
+            code += "data = {}({}); exec('{}')".format(decompress, payload_expr,
+                                                       template.replace("'", "\\'").replace("\n", "\\n"))
+        elif kind == "bytecode":
+            template = self.bytecode_launcher.format(cache=self._cache_dir(), payload_hash=self._payload_hash(payload),
+                                                     decompress=decompress, payload=payload_expr)
+            code += "exec('{}')".format(template.replace("'", "\\'").replace("\n", "\\n"))
+        else:
+            code += "decoded_string = {}({}).decode(); exec(decoded_string)".format(decompress, payload_expr)
+        return "alias {}='{} -c \"{}\"'".format(name, python_exec, code.replace("'", "'\"'\"'"))
+
+    @staticmethod
+    def _launcher_of(entire_line):
+        return "server" if "_socket" in entire_line else "inline"
+
+    @staticmethod
+    def _payload_hash(payload):
+        import hashlib
+        return hashlib.sha256(payload).hexdigest()[:32]
+
+    @staticmethod
+    def _cache_dir():
+        return os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(os.environ["HOME"], ".cache"),
+                            "one-liner")
+
+    def _write_blob(self, payload):
+        blob_hash = self._payload_hash(payload)
+        blob_path = os.path.join(self.one_liner_blob_dir, blob_hash)
+        if not os.path.exists(blob_path):
+            os.makedirs(self.one_liner_blob_dir, exist_ok=True)
+            with open(blob_path + "." + str(os.getpid()), 'wb') as blob_file:
+                blob_file.write(payload)
+            os.replace(blob_path + "." + str(os.getpid()), blob_path)
+        return blob_hash
+
+    @staticmethod
+    def _blob_ref(entire_line):
+        import re
+        blob_ref = re.search(r"\.blobs/([0-9a-f]+)\\?'", entire_line)
+        return blob_ref.group(1) if blob_ref else None
+
+    def _read_payload(self, entire_line):
+        # referenced form: the payload lives in the blob directory
+        blob_hash = self._blob_ref(entire_line)
+        if blob_hash:
+            with open(os.path.join(self.one_liner_blob_dir, blob_hash), 'rb') as blob_file:
+                if not os.fstat(blob_file.fileno()).st_size:
+                    return b""
+                with mmap.mmap(blob_file.fileno(), 0, access=mmap.ACCESS_READ) as blob:
+                    return blob[:]
+        # inline form: the payload is base64 encoded in the alias line
+        import re
+        base64_code = re.search(r"b\\?'\"'\"'([A-Za-z0-9+/=]*)\\?'\"'\"'", entire_line).group(1)
+        return binascii.a2b_base64(base64_code)
+
+    def _payload_hash_of(self, entire_line):
+        # None for the aliases that weren't created by one-liner
+        try:
+            return self._blob_ref(entire_line) or self._payload_hash(self._read_payload(entire_line))
+        except (AttributeError, ValueError):
+            return None
+
+    def _decode_source(self, entire_line):
+        byte_array = self._decompress(self._read_payload(entire_line), self._codec_of(entire_line),
+                                      self._zdict_of(entire_line))
+        if "MAGIC_NUMBER" in entire_line:
+            # bytecode payload: skip the magic number and the code object
+            byte_array = byte_array[8 + int.from_bytes(byte_array[4:8], 'little'):]
+        return byte_array.decode()
+
+    def _load_code(self, entire_line):
+        # the code object the alias executes, the same way its launcher gets it (without the code object cache)
+        byte_array = self._decompress(self._read_payload(entire_line), self._codec_of(entire_line),
+                                      self._zdict_of(entire_line))
+        if "MAGIC_NUMBER" in entire_line:
+            n = 8 + int.from_bytes(byte_array[4:8], 'little')
+            if byte_array[:4] == MAGIC_NUMBER:
+                return marshal.loads(byte_array[8:n])
+            byte_array = byte_array[n:]
+        return compile(byte_array.decode(), '<string>', 'exec')
+
+    def _handle_stats(self, oneLinerDB):
+        info_and_params = oneLinerDB.pop("info_and_params")
+        stats = [self._one_liner_stats(name, entry) for name, entry in oneLinerDB.items()]
+        stats.sort(key=lambda one_liner_stats: one_liner_stats["line_length"], reverse=True)
+
+        blobs = os.listdir(self.one_liner_blob_dir) if os.path.isdir(self.one_liner_blob_dir) else []
+        total = {"aliases": len(stats),
+                 "file_size": os.path.getsize(self.one_liner_alias_file),
+                 "header_size": len(info_and_params["contents"].encode('utf-8')),
+                 "alias_lines_size": sum(one_liner_stats["line_length"] for one_liner_stats in stats),
+                 "comments_size": sum(len("".join(entry["comments"]).encode('utf-8')) for entry in oneLinerDB.values()),
+                 "blobs_size": sum(os.path.getsize(os.path.join(self.one_liner_blob_dir, blob)) for blob in blobs),
+                 "source_ms": self._source_time()}
+
+        if self.args.json:
+            import json
+            print(json.dumps({"aliases": stats, "total": total}, indent=2))
+            return
+        print("{:24s} {:6s} {:8s} {:6s} {:>9s} {:>11s} {:>6s} {:>9s} {:>10s}".format(
+            "name", "store", "kind", "codec", "raw", "compressed", "ratio", "line", "decode ms"))
+        for one_liner_stats in stats:
+            if "error" in one_liner_stats:
+                print("{:24s} {:6s} {:8s} {:6s} {} {}".format(*[one_liner_stats[key] for key in
+                                                                ["name", "store", "kind", "codec", "error"]],
+                                                              self.fmt.crossmark))
+                continue
+            print("{:24s} {:6s} {:8s} {:6s} {:9d} {:11d} {:6.2f} {:9d} {:10.3f}".format(
+                *[one_liner_stats[key] for key in ["name", "store", "kind", "codec", "raw_size", "compressed_size",
+                                                   "ratio", "line_length", "decode_ms"]]))
+        print("\n{} one-liners, {} bytes in total: {} bytes of alias lines, {} bytes of comments, {} bytes of header"
+              "\n{} bytes in the blob directory, sourcing the .one-liner file takes {:.3f} ms".
+              format(total["aliases"], total["file_size"], total["alias_lines_size"], total["comments_size"],
+                     total["header_size"], total["blobs_size"], total["source_ms"]))
+
+    def _one_liner_stats(self, name, entry):
+        import lzma
+        entire_line = entry["entire_line"]
+        one_liner_stats = {"name": name, "store": "blob" if self._blob_ref(entire_line) else "inline",
+                           "kind": "bytecode" if "MAGIC_NUMBER" in entire_line else "source",
+                           "codec": self._codec_of(entire_line), "line_length": len(entire_line.encode('utf-8'))}
+        try:
+            one_liner_stats["raw_size"] = len(self._decode_source(entire_line).encode('utf-8'))
+            one_liner_stats["compressed_size"] = len(self._read_payload(entire_line))
+            one_liner_stats["ratio"] = one_liner_stats["compressed_size"] / max(one_liner_stats["raw_size"], 1)
+            decode_times = []
+            for _ in range(3):
+                start = time.perf_counter()
+                self._load_code(entire_line)
+                decode_times.append((time.perf_counter() - start) * 1000)
+            one_liner_stats["decode_ms"] = min(decode_times)
+        except (AttributeError, ValueError, OSError, SyntaxError, zlib.error, lzma.LZMAError) as e:
+            one_liner_stats["error"] = str(e) or type(e).__name__
+        return one_liner_stats
+
+    def _source_time(self):
+        import subprocess
+        source_times = []
+        for _ in range(3):
+            start = time.perf_counter()
+            subprocess.run([os.environ.get("SHELL", "/bin/bash"), "-c", "source " + self.one_liner_alias_file],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            source_times.append((time.perf_counter() - start) * 1000)
+        return min(source_times)
+
+    def _handle_server(self, verb):
+        pid = self._server_pid()
+        if verb == "status":
+            if pid:
+                print("{} The server is running (pid {}) on {}".format(self.fmt.checkmark, pid,
+                                                                       self.one_liner_server_socket))
+            else:
+                print("{} The server isn't running, the '--launcher server' one-liners run inline".
+                      format(self.fmt.crossmark))
+        elif verb == "stop":
+            if not pid:
+                self.logger.error("The server isn't running! {}".format(self.fmt.crossmark))
+                return
+            import signal
+            os.kill(pid, signal.SIGTERM)
+            print("Stopping the server (pid {}) is successful {}".format(pid, self.fmt.bang))
+        elif pid:
+            self.logger.error("The server is already running (pid {})! {}".format(pid, self.fmt.crossmark))
+        elif self.args.foreground:
+            self._serve(self.args.preload)
+        else:
+            self._start_server_daemon()
+
+    def _server_pid(self):
+        # the pid of the running server, None if there is no server accepting connections on the socket
+        import socket
+        try:
+            with open(self.one_liner_server_pid_file, 'r', encoding='utf-8') as pid_file:
+                pid = int(pid_file.read())
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                return pid if sock.connect_ex(self.one_liner_server_socket) == 0 else None
+        except (OSError, ValueError):
+            return None
+
+    def _start_server_daemon(self):
+        pid = os.fork()
+        if pid == 0:
+            # detach from the terminal and the session of the caller
+            os.setsid()
+            null_fd = os.open(os.devnull, os.O_RDWR)
+            for fd in range(3):
+                os.dup2(null_fd, fd)
+            try:
+                self._serve(self.args.preload)
+            finally:
+                os._exit(0)
+        # wait until the server accepts connections
+        for _ in range(200):
+            if self._server_pid():
+                print("Starting the server (pid {}) is successful {}".format(pid, self.fmt.bang))
+                print("The '--launcher server' one-liners now run in a child of the server {}".format(self.fmt.rocket))
+                return
+            if os.waitpid(pid, os.WNOHANG)[0]:
+                break
+            time.sleep(0.01)
+        self.logger.error("The server couldn't be started, try 'one-liner server start --foreground -v' {}".
+                          format(self.fmt.crossmark))
+
+    def _serve(self, preload):
+        import importlib
+        import signal
+        import socket
+        for module in preload:
+            try:
+                importlib.import_module(module)
+            except ImportError:
+                self.logger.warning("Couldn't preload the module '{}' {}".format(module, self.fmt.warning))
+
+        if os.path.exists(self.one_liner_server_socket):
+            os.remove(self.one_liner_server_socket)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # only the user can connect to the socket
+        umask = os.umask(0o177)
+        try:
+            server.bind(self.one_liner_server_socket)
+        finally:
+            os.umask(umask)
+        server.listen(64)
+        with open(self.one_liner_server_pid_file, 'w', encoding='utf-8') as pid_file:
+            pid_file.write(str(os.getpid()))
+
+        def stop(signum, frame):
+            raise SystemExit
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        # the request handlers are reaped by the kernel
+        signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+        self.logger.debug("Serving on {} with {} preloaded".format(self.one_liner_server_socket, ", ".join(preload)))
+
+        # (precompiled, payload hash) -> code object, compiled once in the server and inherited by the forked children.
+        # Ordered from the least to the most recently used, the least recently used one is dropped past the limit
+        codes = {}
+        try:
+            while True:
+                conn, _ = server.accept()
+                fds = []
+                with conn:
+                    try:
+                        msg, fds, _, _ = socket.recv_fds(conn, 8, 3)
+                        request_size, request = int.from_bytes(msg, 'little'), b""
+                        while len(request) < request_size:
+                            chunk = conn.recv(request_size - len(request))
+                            if not chunk or len(fds) != 3:
+                                raise EOFError("incomplete request")
+                            request += chunk
+                        precompiled, data, argv, cwd, env = marshal.loads(request)
+                        key = (precompiled, self._payload_hash(data))
+                        code = codes.pop(key) if key in codes else self._server_code(precompiled, data)
+                        codes[key] = code
+                        if len(codes) > self.server_code_cache_size:
+                            codes.pop(next(iter(codes)))
+                        if os.fork() == 0:
+                            server.close()
+                            self._serve_request(conn, fds, code, argv, cwd, env)
+                    except (OSError, ValueError, EOFError, TypeError, SyntaxError) as e:
+                        self.logger.debug("Dropping the request: {}".format(e))
+                    finally:
+                        for fd in fds:
+                            os.close(fd)
+        finally:
+            server.close()
+            for path in [self.one_liner_server_socket, self.one_liner_server_pid_file]:
+                if os.path.exists(path):
+                    os.remove(path)
+
+    @staticmethod
+    def _server_code(precompiled, data):
+        if precompiled:
+            n = 8 + int.from_bytes(data[4:8], 'little')
+            if data[:4] == MAGIC_NUMBER:
+                return marshal.loads(data[8:n])
+            data = data[n:]
+        return compile(data, '<string>', 'exec')
+
+    def _serve_request(self, conn, fds, code, argv, cwd, env):
+        # request handler: runs the one-liner in a child of its own, reports its pid so that the client can forward
+        # the signals, then its exit code
+        import signal
+        try:
+            for signum in [signal.SIGTERM, signal.SIGINT, signal.SIGCHLD]:
+                signal.signal(signum, signal.SIG_DFL)
+            pid = os.fork()
+            if pid == 0:
+                conn.close()
+                self._run_request(fds, code, argv, cwd, env)
+            for fd in fds:
+                os.close(fd)
+            conn.sendall(pid.to_bytes(4, 'little'))
+            status = os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1])
+            # killed by a signal: the exit code the shell would report
+            conn.sendall((status if status >= 0 else 128 - status).to_bytes(4, 'little', signed=True))
+        finally:
+            os._exit(0)
+
+    @staticmethod
+    def _run_request(fds, code, argv, cwd, env):
+        import atexit
+        import traceback
+        import types
+        status = 1
+        try:
+            for fd, target_fd in zip(fds, range(3)):
+                os.dup2(fd, target_fd)
+                os.close(fd)
+            sys.stdin = open(0, 'r', closefd=False)
+            sys.stdout = open(1, 'w', closefd=False)
+            sys.stderr = open(2, 'w', buffering=1, errors='backslashreplace', closefd=False)
+            os.chdir(cwd)
+            os.environ.clear()
+            os.environ.update(env)
+            sys.argv = argv
+            # a fresh __main__ for the one-liner, the server's own one is left alone
+            main = types.ModuleType("__main__")
+            sys.modules["__main__"] = main
+            exec(code, main.__dict__)
+            status = 0
+        except SystemExit as e:
+            if e.code is None or isinstance(e.code, int):
+                status = e.code or 0
+            else:
+                print(e.code, file=sys.stderr)
+        except BaseException as e:
+            # the traceback as the interpreter would print it, without the frame of this method
+            sys.stdout.flush()
+            traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+            status = 128 + 2 if isinstance(e, KeyboardInterrupt) else 1
+        finally:
+            try:
+                atexit._run_exitfuncs()
+                sys.stdout.flush()
+                sys.stderr.flush()
+            finally:
+                os._exit(status)
+
+    def _handle_search(self, oneLinerIndex, query):
+        import re
+        try:
+            pattern = re.compile(query if self.args.regex else re.escape(query),
+                                 re.IGNORECASE if self.args.ignore_case else 0)
+        except re.error as e:
+            self.logger.error("Invalid regular expression: {} {}".format(e, self.fmt.crossmark))
+            return
+
+        # the decoded sources are cached by payload hash (and dictionary), only the new payloads are decoded across the
+        # process pool
+        names = sorted(name for name, (_, _, payload_hash) in oneLinerIndex.items()
+                       if payload_hash and name != "one-liner")
+        source_paths, sources, missing = {}, {}, []
+        with open(self.one_liner_alias_file, 'rb') as file, \
+                mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as doc:
+            for name in names:
+                offset, length, payload_hash = oneLinerIndex[name]
+                zdict_version = self._zdict_version(doc[offset:offset + length].decode('utf-8'))
+                source_paths[name] = self._source_cache_path(payload_hash, zdict_version)
+        for name in names:
+            try:
+                with open(source_paths[name], 'r', encoding='utf-8') as source_file:
+                    sources[name] = source_file.read()
+            except OSError:
+                missing.append(name)
+        sources.update(zip(missing, self._pool_map("_cache_source", [(name, source_paths[name]) for name in missing])))
+        self._prune_source_cache(set(source_paths.values()))
+
+        results = []
+        for name in names:
+            lines = (sources[name] or "").splitlines()
+            matches = {i for i, line in enumerate(lines) if pattern.search(line)}
+            if not matches:
+                continue
+            if self.args.names_only:
+                results.append({"name": name})
+                continue
+            # the matching lines and their context, overlapping context is only shown once
+            shown = sorted({j for i in matches for j in range(max(0, i - self.args.context),
+                                                              min(len(lines), i + self.args.context + 1))})
+            results += [{"name": name, "line": j + 1, "text": lines[j], "match": j in matches} for j in shown]
+
+        if self.args.json:
+            import json
+            print(json.dumps(results, indent=2))
+            return
+        previous = None
+        for result in results:
+            if self.args.names_only:
+                print(result["name"])
+                continue
+            if previous and (previous["name"] != result["name"] or previous["line"] + 1 != result["line"]) and \
+                    self.args.context:
+                print("--")
+            separator = ":" if result["match"] else "-"
+            print("{}{}{}{}{}".format(self.fmt.bold_text(result["name"]), separator, result["line"], separator,
+                                      result["text"]))
+            previous = result
+
+    def _source_cache_path(self, payload_hash, zdict_version=None):
+        # the source of a '--codec zdict' payload depends on the dictionary as well
+        zdict = self._zdicts().get(zdict_version) if zdict_version is not None else None
+        source_name = payload_hash + ("-" + self._payload_hash(zdict) if zdict else "")
+        return os.path.join(self._source_cache_dir(), source_name + ".py")
+
+    def _source_cache_dir(self):
+        # every .one-liner file has its own source cache, so that pruning one leaves the others alone
+        alias_file = os.path.realpath(self.one_liner_alias_file).encode('utf-8', 'surrogateescape')
+        return os.path.join(self._cache_dir(), "sources", self._payload_hash(alias_file))
+
+    def _prune_source_cache(self, source_paths):
+        # remove the cached sources of the payloads that are no longer in the .one-liner file
+        source_dir = self._source_cache_dir()
+        if not os.path.isdir(source_dir):
+            return
+        for source_name in os.listdir(source_dir):
+            source_path = os.path.join(source_dir, source_name)
+            if source_name.endswith(".py") and source_path not in source_paths:
+                self.logger.debug("Removing the cached source '{}'".format(source_name))
+                try:
+                    os.remove(source_path)
+                except OSError:
+                    pass
+
+    def _cache_source(self, job):
+        # decoded source of the one-liner, None if it can't be decoded
+        name, source_path = job
+        try:
+            oneLinerIndex = self.one_liner_index["entries"]
+            source = self._decode_source(self._read_entry(oneLinerIndex, name)["entire_line"])
+        except (AttributeError, ValueError, OSError, zlib.error):
+            self.logger.debug("Couldn't decode the one-liner '{}'".format(name))
+            return None
+        try:
+            os.makedirs(os.path.dirname(source_path), exist_ok=True)
+            with open(source_path + "." + str(os.getpid()), 'w', encoding='utf-8') as source_file:
+                source_file.write(source)
+            os.replace(source_path + "." + str(os.getpid()), source_path)
+        except OSError:
+            self.logger.debug("Couldn't cache the source of the one-liner '{}'".format(name))
+        return source
+
+    def _handle_verify(self, oneLinerIndex):
+        max_length = self.args.max_length or os.sysconf("SC_ARG_MAX")
+        if sys.platform.startswith("linux") and not self.args.max_length:
+            max_length = min(max_length, self.max_arg_strlen)
+        # read before forking so that the workers inherit them
+        self._zdicts()
+        results = self._pool_map("_verify_one", [(name, max_length) for name in sorted(oneLinerIndex)])
+        broken = [result for result in results if result["errors"]]
+
+        if self.args.quarantine and broken:
+            # the one-liner tool is never quarantined, without it there is nothing to restore the others with
+            quarantined = [result for result in broken if result["name"] != "one-liner"]
+            entries = {result["name"]: self._read_entry(oneLinerIndex, result["name"]) for result in quarantined}
+            with open(self.one_liner_quarantine_file, 'a', encoding='utf-8') as file:
+                for result in quarantined:
+                    entry = entries[result["name"]]
+                    comments = ["# quarantined by verify: " + error for error in result["errors"]]
+                    entry["comments"][0] = "\n".join(comments + [entry["comments"][0]]).strip("\n")
+                    file.write("\n" + self._entry_text(entry))
+            if entries:
+                self.update_doc({name: None for name in entries})
+            for result in quarantined:
+                result["quarantined"] = True
+
+        if self.args.json:
+            import json
+            print(json.dumps(results, indent=2))
+        else:
+            for result in broken:
+                for error in result["errors"]:
+                    self.logger.error("'{}': {} {}".format(self.fmt.bold_text(result["name"]), error,
+                                                           self.fmt.crossmark))
+                if result.get("quarantined"):
+                    print("Moved '{}' to {} {}".format(self.fmt.bold_text(result["name"]),
+                                                      self.one_liner_quarantine_file, self.fmt.writing))
+            if not self.one_liner_index["spliceable"]:
+                self.logger.warning("Some one-liners are defined more than once, the last definition is verified. "
+                                    "Run fix to compact the .one-liner file {}".format(self.fmt.warning))
+            print("{} {} one-liner(s) verified, {} broken {}".format(
+                self.fmt.checkmark if not broken else self.fmt.crossmark, len(results), len(broken),
+                self.fmt.thumbsup if not broken else self.fmt.warning))
+            if any(result.get("quarantined") for result in broken):
+                self._source()
+        if broken:
+            raise SystemExit(1)
+
+    def _verify_one(self, job):
+        # every check that can be done without running the one-liner, the errors are collected rather than raised
+        import re
+        name, max_length = job
+        result = {"name": name, "errors": []}
+        try:
+            entire_line = self._read_entry(self.one_liner_index["entries"], name)["entire_line"]
+        except (OSError, ValueError, IndexError) as e:
+            result["errors"].append("the one-liner can't be read from the .one-liner file: {}".format(e))
+            return result
+        if not re.search(self.alias_regex, entire_line):
+            result["errors"].append("the alias line doesn't match the alias regex")
+        if " -c \"" not in entire_line:
+            # an alias that wasn't created by one-liner
+            return result
+
+        code = self._alias_code(entire_line)
+        if code is None:
+            result["errors"].append("the shell quoting of the alias line is broken")
+            return result
+        version = self._zdict_version(entire_line)
+        length = len(code.encode('utf-8'))
+        if version is not None:
+            if version not in self._zdicts():
+                result["errors"].append("the compression dictionary ONELINER_ZDICT_{} doesn't exist".format(version))
+                return result
+            # the shell expands the dictionary into the code
+            length += len(binascii.b2a_base64(self._zdicts()[version], newline=False)) - \
+                len("$ONELINER_ZDICT_{}".format(version))
+        if length > max_length:
+            result["errors"].append("the code of the alias is {} bytes, longer than the {} bytes the interpreter "
+                                    "can be given, use --store blob".format(length, max_length))
+        try:
+            compile(code, name + " launcher", 'exec')
+        except (SyntaxError, ValueError) as e:
+            result["errors"].append("the launcher doesn't compile: {}".format(e))
+
+        try:
+            payload = self._read_payload(entire_line)
+            blob_hash = self._blob_ref(entire_line)
+            if blob_hash and self._payload_hash(payload) != blob_hash:
+                result["errors"].append("the blob {} doesn't match its hash".format(blob_hash))
+            byte_array = self._decompress(payload, self._codec_of(entire_line), self._zdict_of(entire_line))
+            if "MAGIC_NUMBER" in entire_line:
+                n = 8 + int.from_bytes(byte_array[4:8], 'little')
+                if byte_array[:4] == MAGIC_NUMBER:
+                    marshal.loads(byte_array[8:n])
+                byte_array = byte_array[n:]
+            compile(byte_array.decode('utf-8'), name, 'exec')
+        except SyntaxError as e:
+            result["errors"].append("the script doesn't compile: {}".format(e))
+        except Exception as e:
+            result["errors"].append("the payload doesn't decode: {}: {}".format(type(e).__name__, e))
+        return result
+
+    @staticmethod
+    def _alias_code(entire_line):
+        # the code the shell passes to the interpreter, None if the quoting of the alias line is broken. The alias
+        # value is single-quoted ('"'"' for a quote) and the code in it double-quoted
+        import re
+        value = entire_line.split("=", 1)[1] if "=" in entire_line else ""
+        if len(value) < 2 or value[0] != "'" or value[-1] != "'" or "'" in value[1:-1].replace("'\"'\"'", ""):
+            return None
+        command = re.fullmatch(r'[^"]* -c "((?:[^"\\`$]|\\.|\$ONELINER_ZDICT_[0-9]+)*)"',
+                               value[1:-1].replace("'\"'\"'", "'"), re.DOTALL)
+        return re.sub(r'\\([\\"$`])', r'\1', command.group(1)) if command else None
+
+    def _handle_export_pack(self, oneLinerIndex, name, pack_path):
+        if name and name not in oneLinerIndex:
+            self.logger.error("This one-liner doesn't exist! {}".format(self.fmt.crossmark))
+            return
+        # the one-liner tool isn't packed, the other host has its own
+        names = [name] if name else sorted(n for n in oneLinerIndex if n != "one-liner")
+        entries, payloads, offset = [], [], 0
+        for one_liner in names:
+            entry = self._read_entry(oneLinerIndex, one_liner)
+            entire_line = entry["entire_line"]
+            try:
+                payload = self._read_payload(entire_line)
+                if self._zdict_version(entire_line) is not None:
+                    self._zdicts()[self._zdict_version(entire_line)]
+            except (AttributeError, ValueError, OSError, KeyError):
+                self.logger.warning("Skipping '{}', it wasn't created by one-liner or its blob is missing {}".
+                                    format(one_liner, self.fmt.warning))
+                continue
+            entries.append({"name": one_liner, "comments": entry["comments"], "hash": self._payload_hash(payload),
+                            "kind": "bytecode" if "MAGIC_NUMBER" in entire_line else "source",
+                            "codec": self._codec_of(entire_line), "zdict": self._zdict_version(entire_line),
+                            "store": "blob" if self._blob_ref(entire_line) else "inline",
+                            "launcher": self._launcher_of(entire_line), "offset": offset, "length": len(payload)})
+            payloads.append(payload)
+            offset += len(payload)
+        zdicts = {entry["zdict"]: self._zdicts()[entry["zdict"]] for entry in entries if entry["zdict"] is not None}
+        header = marshal.dumps({"entries": entries, "zdicts": zdicts})
+
+        if pack_path == "-":
+            file = sys.stdout.buffer
+        else:
+            try:
+                file = open(pack_path, 'xb')
+            except FileExistsError:
+                self.logger.warning("Overwrite protection: This file already exists! {}".format(self.fmt.warning))
+                self._ask_approval("The existing file will be overwritten.")
+                file = open(pack_path, 'wb')
+        with self.profiler.phase("write_pack"):
+            file.write(self.pack_magic + len(header).to_bytes(8, 'little') + header)
+            for payload in payloads:
+                file.write(payload)
+            file.flush()
+        if pack_path != "-":
+            file.close()
+            print("Packed {} one-liner(s) to {} {}".format(len(entries), pack_path, self.fmt.writing))
+
+    def _handle_import_pack(self, oneLinerIndex, pack_path):
+        file = sys.stdin.buffer if pack_path == "-" else open(pack_path, 'rb')
         try:
-            popped = oneLinerDB.pop(old_name)
+            pack = OneLiner.PackReader(file)
+        except (ValueError, EOFError, TypeError, KeyError) as e:
+            self.logger.error("Couldn't read the pack {}: {} {}".format(pack_path, e, self.fmt.crossmark))
+            return
+
+        # pack version -> version here of the dictionaries, matched by content
+        zdicts, zdict_versions = dict(self._zdicts()), {}
+        results, changes = [], {}
+        with self.profiler.phase("read_pack"):
+            for entry in pack.entries:
+                result = {"name": entry["name"]}
+                results.append(result)
+                # a one-liner with the same payload is skipped without reading its payload
+                if entry["name"] in oneLinerIndex and oneLinerIndex[entry["name"]][2] == entry["hash"]:
+                    result["action"] = "unchanged"
+                    continue
+                if entry["name"] == "one-liner":
+                    result["error"] = "the one-liner tool can't be imported"
+                    continue
+                payload = pack.payload(entry)
+                if self._payload_hash(payload) != entry["hash"]:
+                    result["error"] = "the payload doesn't match its hash"
+                    continue
+                # a dictionary that doesn't exist here yet is added with a new version
+                zdict = pack.zdicts.get(entry["zdict"])
+                if zdict is not None and entry["zdict"] not in zdict_versions:
+                    zdict_versions[entry["zdict"]] = next((v for v, d in zdicts.items() if d == zdict),
+                                                          max(zdicts, default=0) + 1)
+                    zdicts[zdict_versions[entry["zdict"]]] = zdict
+                entire_line = self._alias_line(entry["name"], payload, store=entry["store"], kind=entry["kind"],
+                                               codec=entry["codec"], launcher=entry["launcher"],
+                                               zdict_version=zdict_versions.get(entry["zdict"]))
+                changes[entry["name"]] = {"entire_line": entire_line, "comments": entry["comments"]}
+                result["action"] = "overwritten" if entry["name"] in oneLinerIndex else "created"
+        pack.close()
+        if pack_path != "-":
+            file.close()
+
+        self._approve_conflicts(oneLinerIndex, changes, self.args.overwrite)
+        # everything is merged in one pass, together with the dictionaries if any of them is new
+        if zdicts != self._zdicts():
+            oneLinerDB = self.parse_doc()
+            self._set_zdict_params(oneLinerDB, zdicts)
+            oneLinerDB.update(changes)
+            self.construct_doc(oneLinerDB)
+        elif changes:
+            self.update_doc(changes)
+
+        if self.args.json:
+            import json
+            print(json.dumps(results, indent=2))
+        else:
+            for result in results:
+                if "error" in result:
+                    self.logger.error("'{}': {} {}".format(result["name"], result["error"], self.fmt.crossmark))
+                elif result["action"] != "unchanged":
+                    print("{} one-liner '{}' {}".format(result["action"].capitalize(),
+                                                        self.fmt.bold_text(result["name"]), self.fmt.checkmark))
+            print("{} {} one-liner(s) imported, {} unchanged {}".format(
+                self.fmt.checkmark, len(changes), len([r for r in results if r.get("action") == "unchanged"]),
+                self.fmt.bang if changes else self.fmt.thumbsup))
+            if changes:
+                self._source()
+
+    def _handle_rename(self, oneLinerIndex, old_name, new_name):
+        try:
+            popped = self._read_entry(oneLinerIndex, old_name)
             popped['entire_line'] = "alias " + new_name + \
                                     popped['entire_line'].lstrip(" ").lstrip("alias").lstrip(" ").lstrip(old_name)
-            oneLinerDB[new_name] = popped
             self._ask_approval("You are about to rename a one-liner from '{}' to '{}' {}".
                                format(self.fmt.bold_text(old_name), self.fmt.bold_text(new_name), self.fmt.warning))
             print("Renaming '{}' to '{}' is successful {}".
                   format(self.fmt.bold_text(old_name), self.fmt.bold_text(new_name), self.fmt.bang))
-            self.construct_doc(oneLinerDB)
+            self.update_doc({old_name: None, new_name: popped})
         except KeyError:
             self.logger.error("This one-liner doesn't exist! {}".format(self.fmt.crossmark))
 
-    def _handle_export(self, oneLinerDB, name, filepath):
+    def _handle_export(self, oneLinerIndex, name, filepath):
         try:
-            base64_code = re.search("'\"'\"'.*'\"'\"'", oneLinerDB[name]["entire_line"]).group().strip("'\"'\"'")
+            source = self._decode_source(self._read_entry(oneLinerIndex, name)["entire_line"])
             if filepath:
                 print("filepath is specified {}, saving to that file {}".format(self.fmt.checkmark, self.fmt.writing))
                 with open(filepath, 'x', encoding='utf-8') as new_file:
-                    new_file.write(zlib.decompress(base64.b64decode(base64_code)).decode())
+                    new_file.write(source)
             else:
                 self.logger.warning("filepath is not specified {}, dumping to the terminal {}".
                                     format(self.fmt.crossmark, self.fmt.lookbelow))
-                print("{}\n{}\n{}".format("*" * 50, zlib.decompress(base64.b64decode(base64_code)).decode(), "*" * 50))
+                print("{}\n{}\n{}".format("*" * 50, source, "*" * 50))
         except KeyError:
             self.logger.error("This one-liner doesn't exist! {}".format(self.fmt.crossmark))
         except FileExistsError:
             self.logger.warning("Overwrite protection: This file already exists! {}".format(self.fmt.warning))
             self._ask_approval("The existing file will be overwritten.")
-            base64_code = re.search("'\"'\"'.*'\"'\"'", oneLinerDB[name]["entire_line"]).group().strip("'\"'\"'")
             with open(filepath, 'w', encoding='utf-8') as new_file:
-                new_file.write(zlib.decompress(base64.b64decode(base64_code)).decode())
+                new_file.write(source)
 
-    def _handle_list(self, oneLinerDB):
-        for one_liner in sorted(oneLinerDB.keys()):
+    def _handle_list(self, oneLinerIndex):
+        for one_liner in sorted(oneLinerIndex.keys()):
             print(one_liner) if one_liner not in ["one-liner", "info_and_params"] else None
 
-    def _handle_delete(self, oneLinerDB, name):
+    def _handle_delete(self, oneLinerIndex, name):
         try:
-            oneLinerDB.pop(name)
+            oneLinerIndex[name]
             self._ask_approval("You are about to {} the one-liner: '{}' {}".
                                format(self.fmt.bold_text("delete"), self.fmt.bold_text(name), self.fmt.warning))
             print("Deleting '{}' is successful {}".format(self.fmt.bold_text(name), self.fmt.bang))
-            self.construct_doc(oneLinerDB)
+            self.update_doc({name: None})
         except KeyError:
             self.logger.error("This one-liner doesn't exist! {}".format(self.fmt.crossmark))
 
@@ -358,6 +2111,7 @@ class OneLiner:
         print("\n{} Execute the following in shell for changes to take effect:".format(self.fmt.thumbsup))
         print("\tsource {}\n".format(self.one_liner_alias_file))
 
+    @_profiled("approval")
     def _ask_approval(self, statement):
         if self.args.yes:
             return
@@ -371,10 +2125,20 @@ class OneLiner:
             raise SystemExit
 
 
+# the OneLiner instance that the forked pool workers call into, see OneLiner._pool_map
+_pool_one_liner = None
+
+
+def _pool_worker(job):
+    method, arg = job
+    return getattr(_pool_one_liner, method)(arg)
+
+
 if __name__ == "__main__":
     oneLiner = OneLiner(sys.argv[1:])
     try:
         oneLiner.handle()
     except Exception as e:
+        import traceback
         oneLiner.logger.error(oneLiner.fmt.crossmark + " " + e.strerror + " (add -v flag to see debug message)")
         oneLiner.logger.debug(oneLiner.fmt.lookbelow + '\n' + traceback.format_exc())